@@ -0,0 +1,93 @@
+''' Functions to calculate connected correlators.
+'''
+import numpy as np
+from dmrg_helpers.extract.estimator import Estimator
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+
+def site_lookup(estimator_data, size):
+    """Makes arrays to look up the value of a one-point estimator by site.
+
+    Parameters
+    ----------
+    estimator_data: an EstimatorData object.
+        The data of a one-point estimator, in any order.
+    size: an int.
+        The size of the arrays. It must be larger than any site in the data.
+
+    Returns
+    -------
+    values: a numpy array of doubles.
+        The value at each site.
+    known: a numpy array of bools.
+        Whether there is a value for each site.
+    """
+    sites = estimator_data.x_as_np()
+    values = np.zeros(size)
+    known = np.zeros(size, dtype=bool)
+    values[sites] = estimator_data.y_as_np()
+    known[sites] = True
+    return values, known
+
+def connected(two_point, one_point_a, one_point_b=None):
+    """Calculates the connected part of a two-point estimator.
+
+    For each pair of sites (i, j), you get <A_i B_j> - <A_i><B_j>, where
+    `two_point` is the estimator A*B, and `one_point_a` and `one_point_b`
+    the estimators A and B. This works for any pair of operators, like 'n'
+    and 'n', or 's_z' and 's_z'.
+
+    The one-point values are looked up by site in arrays, so they don't need
+    to be in any order, and all the pairs are done at once. Only the sets of
+    parameters in the three estimators, and the pairs whose sites are in
+    the one-point estimators, are kept.
+
+    Parameters
+    ----------
+    two_point: an Estimator.
+        The two-point estimator, e.g. 'n*n'.
+    one_point_a: an Estimator.
+        The one-point estimator for the operator on the first site, e.g. 'n'.
+    one_point_b: an Estimator (defaulted to None).
+        The one-point estimator for the operator on the second site. If
+        None, the same as `one_point_a`.
+
+    Returns
+    -------
+    an Estimator with the connected correlator. Its name is the name of
+    `two_point`.
+
+    Raises
+    ------
+    DMRGException: if the estimators have different meta_keys, or
+    `two_point` has not two sites.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.database import Database
+    >>> from dmrg_helpers.analyze.connected import connected
+    >>> db = Database()
+    >>> db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    >>> n_n, n = db.get_estimators(['n*n', 'n'])
+    >>> fluctuations = connected(n_n, n)
+    """
+    if one_point_b is None:
+        one_point_b = one_point_a
+    if not (two_point.meta_keys == one_point_a.meta_keys ==
+            one_point_b.meta_keys):
+        raise DMRGException('Estimators with different meta keys')
+    result = Estimator(two_point.name, two_point.meta_keys)
+    for key, data in two_point.data.iteritems():
+        if key not in one_point_a.data or key not in one_point_b.data:
+            continue
+        sites = data.sites_as_np()
+        if sites.shape[1] != 2:
+            raise DMRGException('Not a two-point estimator')
+        a, b = one_point_a.data[key], one_point_b.data[key]
+        size = max(sites.max(), a.x_as_np().max(), b.x_as_np().max()) + 1
+        a_values, a_known = site_lookup(a, size)
+        b_values, b_known = site_lookup(b, size)
+        i, j = sites[:, 0], sites[:, 1]
+        keep = a_known[i] & b_known[j]
+        values = data.y_as_np() - a_values[i] * b_values[j]
+        result.add_columns(sites[keep], values[keep], key)
+    return result
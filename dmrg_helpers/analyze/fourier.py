@@ -2,10 +2,118 @@
 '''
 import numpy as np
 from math import pi
-from itertools import izip, chain
+from itertools import izip
 from dmrg_helpers.view.xy_data import XYData, XYDataDict
 from dmrg_helpers.core.dmrg_exceptions import DMRGException
 
+def distance_histogram(estimator_data):
+    """Sums the values of a two-point estimator by the distance of the sites.
+
+    The Fourier transform of a two-point estimator depends on its sites only
+    through their distance, so you use this function to do the sum over the
+    pairs of sites once, whatever the number of momenta.
+
+    Parameters
+    ----------
+    estimator_data: an EstimatorData object.
+        The data of a two-point estimator.
+
+    Returns
+    -------
+    histogram: a numpy array of doubles.
+        The sum of the values of the pairs of sites at each distance.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from dmrg_helpers.extract.estimator import EstimatorData
+    >>> from dmrg_helpers.analyze.fourier import distance_histogram
+    >>> data = EstimatorData()
+    >>> data.extend(np.array([[0, 1], [1, 2], [0, 2]]), np.array([1., 2., 5.]))
+    >>> distance_histogram(data).tolist()
+    [0.0, 3.0, 5.0]
+    """
+    sites = estimator_data.sites_as_np()
+    distances = np.abs(sites[:, 0].astype(int) - sites[:, 1])
+    return np.bincount(distances, weights=estimator_data.y_as_np())
+
+def distance_histograms(estimator_data_list):
+    """Sums the values of two-point estimators by the distance of the sites.
+
+    This is `distance_histogram` for many data sets at once. If all of them
+    have the same sites in the same order, as the runs of a parameter sweep,
+    their values are stacked in an array with a row per data set, and the
+    sums for all of them are done at once.
+
+    Parameters
+    ----------
+    estimator_data_list: a list of EstimatorData objects.
+        The data of a two-point estimator for each set of parameters.
+
+    Returns
+    -------
+    histograms: a numpy array of doubles with shape (n_data, n_distances).
+        The sum of the values of the pairs of sites at each distance, for
+        each data set, padded with zeros.
+    """
+    sites = estimator_data_list[0].sites_as_np()
+    if all(np.array_equal(d.sites_as_np(), sites) 
+           for d in estimator_data_list[1:]) and len(sites):
+        distances = np.abs(sites[:, 0].astype(int) - sites[:, 1])
+        order = np.argsort(distances, kind='mergesort')
+        starts = np.flatnonzero(np.diff(distances[order])) + 1
+        starts = np.concatenate([[0], starts])
+        values = np.array([d.y_as_np() for d in estimator_data_list])
+        histograms = np.zeros((len(estimator_data_list), 
+                               distances.max() + 1))
+        histograms[:, distances[order][starts]] = np.add.reduceat(
+            values[:, order], starts, axis=1)
+        return histograms
+    rows = map(distance_histogram, estimator_data_list)
+    histograms = np.zeros((len(rows), max(len(r) for r in rows)))
+    for histogram, row in izip(histograms, rows):
+        histogram[:len(row)] = row
+    return histograms
+
+def cosine_transform(histogram, momenta=None, length=None):
+    """Calculates the sum over distances of the histogram times cos(q*r).
+
+    If you give the `momenta`, the sums are done at once as the product of
+    the matrix of cosines, with a row for each momentum and a column for
+    each distance, and the histogram. If you don't, the momenta are the ones
+    allowed in a chain of `length` sites, see `generate_momenta`, and the
+    sums are the real part of the FFT of the histogram.
+
+    Parameters
+    ----------
+    histogram: a numpy array of doubles.
+        The values at each distance, as from `distance_histogram`. If it
+        has two dimensions, the last one is the distance, and each row is
+        transformed.
+    momenta: a list of doubles (defaulted to None).
+        The momenta.
+    length: an int (defaulted to None).
+        The length of the chain, used when `momenta` is None.
+
+    Returns
+    -------
+    a numpy array of doubles with the sum for each momentum (and row of
+    the histogram).
+    """
+    histogram = np.asarray(histogram, dtype=float)
+    n_distances = histogram.shape[-1]
+    if momenta is None:
+        # cos(q*r) is the same for distances that differ in `length`
+        padded = np.zeros(histogram.shape[:-1] + 
+                          (-(-n_distances // length) * length,))
+        padded[..., :n_distances] = histogram
+        wrapped = padded.reshape(histogram.shape[:-1] + 
+                                 (-1, length)).sum(axis=-2)
+        return np.fft.fft(wrapped, axis=-1).real
+    momenta = np.asarray(momenta, dtype=float)
+    cosines = np.cos(np.outer(momenta, np.arange(n_distances)))
+    return histogram.dot(cosines.T)
+
 def calculate_fourier_comp_for_two_point_estimator(estimator_data, q):
     """Calculates the Fourier transform for an EstimatorData object.
 
@@ -20,9 +128,7 @@ def calculate_fourier_comp_for_two_point_estimator(estimator_data, q):
     result: A float with the value of the Fourier component.
 
     """
-    sites = map(list, zip(*estimator_data.sites())) 
-    diff = np.array(sites[0], dtype=int)-np.array(sites[1], dtype=int)
-    return 2*np.sum(np.multiply(estimator_data.y_as_np(), np.cos(q*diff)))
+    return 2*cosine_transform(distance_histogram(estimator_data), [q])[0]
 
 def generate_momenta(length):
     """Generates the allowed momenta for a system of a given `length`.
@@ -37,8 +143,14 @@ def generate_momenta(length):
         yield 2*i*pi/length
 
 def calculate_fourier_transform_for_two_point_estimator_data(estimator_data,
-                                                             length):
+                                                             length,
+                                                             momenta=None):
     """Calculates the Fourier transform for a two-point estimator data set.
+
+    The result for each momentum q is 2*sum(y*cos(q*(i-j)))/length, where
+    the sum goes over the pairs of sites (i, j) of the data, and y are
+    their values. All the momenta are calculated at once, see
+    `cosine_transform`.
     
     Parameters
     ----------
@@ -46,6 +158,9 @@ def calculate_fourier_transform_for_two_point_estimator_data(estimator_data,
         The estimator data you want to Fourier transform.
     length: an int.
         the length of the chain you want to generate the momenta for.
+    momenta: a list of doubles (defaulted to None).
+        The momenta for the transform. If None, the ones allowed in the
+        chain, see `generate_momenta`.
 
     Returns
     -------
@@ -53,13 +168,15 @@ def calculate_fourier_transform_for_two_point_estimator_data(estimator_data,
     Fourier transform.
 
     """
-    return XYData([(x, 
-                    calculate_fourier_comp_for_two_point_estimator(
-                        estimator_data, x)/length)
-                    for x in generate_momenta(length)])
+    histogram = distance_histogram(estimator_data)
+    values = 2*cosine_transform(histogram, momenta, length)/length
+    if momenta is None:
+        momenta = list(generate_momenta(length))
+    return XYData(zip(momenta, values.tolist()))
 
 def calculate_fourier_transform_for_two_point_estimator(estimator, 
-                                                        length_label):
+                                                        length_label,
+                                                        momenta=None):
     """Calculates the Fourier transform for a two-point estimator.
 
     Parameters
@@ -69,25 +186,35 @@ def calculate_fourier_transform_for_two_point_estimator(estimator,
     length_label: a string (default to 'number_of_sites').
         The key you used in the Estimator.meta_keys to store the length of the
         chain in the DMRG code.
+    momenta: a list of doubles (defaulted to None).
+        The momenta for the transform. If None, the ones allowed in each
+        chain, see `generate_momenta`.
 
     Returns
     -------
     result: a list of two-tuples with the momenta and the values for the
     Fourier transform.
 
+    The sets of parameters with the same length are transformed together:
+    their histograms, see `distance_histograms`, are stacked in an array, 
+    and transformed with a single FFT or product of matrices.
     """
-    fourier_transforms = []
+    by_length = {}
     for key, data in estimator.data.iteritems():
         if length_label in estimator.keys:
             length = int(estimator.get_metadata_as_dict(key)[length_label])
         else:
             length = get_length_directly_from_data(data)
-        fourier_transforms.append(
-            calculate_fourier_transform_for_two_point_estimator_data(data,
-                                                                     length))
-    return XYDataDict(estimator.meta_keys, 
-                      dict(izip(estimator.data.iterkeys(), 
-                           fourier_transforms)))
+        by_length.setdefault(length, []).append(key)
+
+    fourier_transforms = {}
+    for length, keys in by_length.iteritems():
+        histograms = distance_histograms([estimator.data[k] for k in keys])
+        values = 2*cosine_transform(histograms, momenta, length)/length
+        x = list(generate_momenta(length)) if momenta is None else momenta
+        for key, y in izip(keys, values.tolist()):
+            fourier_transforms[key] = XYData(zip(x, y))
+    return XYDataDict(estimator.meta_keys, fourier_transforms)
 
 def get_length_directly_from_data(estimator_data):
     """Calculates the length of the system from the estimator data.
@@ -114,7 +241,7 @@ def get_length_directly_from_data(estimator_data):
     DMRGException if estimator_data is empty.
 
     """
-    if not estimator_data.sites():
+    if not len(estimator_data):
         raise DMRGException('Empty estimator data')
-    tmp = [int(i) for i in chain.from_iterable(estimator_data.sites())]
-    return max(tmp)-min(tmp)+1
+    sites = estimator_data.sites_as_np()
+    return int(sites.max())-int(sites.min())+1
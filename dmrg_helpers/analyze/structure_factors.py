@@ -1,6 +1,7 @@
 '''Functions to calculate common structure factors.
 '''
-import numpy as np
+from dmrg_helpers.analyze.connected import connected
+from dmrg_helpers.extract.estimator_expression import LazyEstimator
 from dmrg_helpers.analyze.fourier import (
     calculate_fourier_transform_for_two_point_estimator)
 
@@ -31,6 +32,50 @@ def calculate_spin_struct_factor(db):
                                                             'numberOfSites'))
     return result 
 
+def calculate_full_spin_struct_factor(db, zz='s_z*s_z', pm='s_p*s_m', 
+                                      mp='s_m*s_p'):
+    """Calculates the spin structure factor with the three components.
+
+    The correlator transformed is S_i*S_j = zz + (pm + mp)/2. The three
+    components are got from the database with a single query, combined on
+    the sites they share, and the runs are transformed together, see
+    `EstimatorExpression` and
+    `calculate_fourier_transform_for_two_point_estimator`.
+
+    Parameters
+    ----------
+    db: a Database object.
+        The database obtained after reading the estimators.dat files.
+    zz: a string (defaulted to 's_z*s_z').
+        The name of the estimator for the z component.
+    pm: a string (defaulted to 's_p*s_m').
+        The name of the estimator for S^+_i*S^-_j.
+    mp: a string (defaulted to 's_m*s_p').
+        The name of the estimator for S^-_i*S^+_j. If None, `pm` is used
+        instead, which is fine for real wavefunctions, as then both are
+        equal when i and j are different.
+
+    Returns
+    -------
+    A Estimator object with the spin structure factor.
+
+    Example
+    -------
+    >>> from dmrg_helpers.analyze.structure_factors import (
+    ...     calculate_full_spin_struct_factor)
+    >>> from dmrg_helpers.extract.extract import create_db_from_file
+    >>> db = create_db_from_file('tests/real_data/static/estimators.dat')
+    >>> spin_struct_factor = calculate_full_spin_struct_factor(
+    ...     db, pm='s_m_dag*s_m', mp=None)
+    """
+    zz, pm = LazyEstimator(zz), LazyEstimator(pm)
+    mp = pm if mp is None else LazyEstimator(mp)
+    spin_spin = (zz + 0.5 * (pm + mp)).evaluate(db)
+    result = ( 
+        calculate_fourier_transform_for_two_point_estimator(spin_spin, 
+                                                            'numberOfSites'))
+    return result
+
 def calculate_density_struct_factor(db):
     """Calculates the density (charge) structure factor.
     
@@ -52,14 +97,8 @@ def calculate_density_struct_factor(db):
     >>> charge_struct_factor = calculate_density_struct_factor(db)
     >>> charge_struct_factor.save('charge_struct_factor.dat', 'tests')
     """
-    fluctuations = db.get_estimator('n*n')
-    n = db.get_estimator('n')
-    for key, val in fluctuations.data.iteritems():
-        n_vals = n.data[key].y_as_np()
-        tmp = -1.0 * np.array([n_vals[int(s[0])] * n_vals[int(s[1])] 
-                              for s in val.sites()])
-        tmp += val.y_as_np()
-        val.values_list = tmp.tolist()
+    n_n, n = db.get_estimators(['n*n', 'n'])
+    fluctuations = connected(n_n, n)
     result = ( 
         calculate_fourier_transform_for_two_point_estimator(fluctuations, 
                                                             'numberOfSites'))
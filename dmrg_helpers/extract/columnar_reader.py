@@ -0,0 +1,321 @@
+#
+# File: columnar_reader.py
+# Author: Ivan Gonzalez
+#
+""" A module to read estimator files into columns of numpy arrays.
+"""
+import os
+import re
+import string
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.core.dmrg_logging import logger
+from dmrg_helpers.extract.open_estimator_file import open_estimator_file
+from dmrg_helpers.extract.operator_table import operator_table
+from dmrg_helpers.extract.reader import FileReader
+
+# Single-site operator names contain no numbers, so all the digits in an
+# estimator name are the sites. This table blanks out everything else.
+# The newlines are kept, to know the row of each site.
+non_digits = ''.join(c for c in map(chr, xrange(256)) 
+                     if c not in string.digits + '\n')
+only_digits = string.maketrans(non_digits, ' ' * len(non_digits))
+
+# To check that each line has a name and a value, every token is made an 'x'
+# and the blanks inside the lines are removed: the lines must be 'xx'.
+token = re.compile(r'\S+')
+blanks_in_line = re.compile(r'[^\S\n]+')
+
+class ColumnarFileReader(FileReader):
+    """A fast file reader that stores the data in columns.
+
+    Reads an estimators.dat file like FileReader does, but instead of a list
+    with one entry per line, the data are stored in numpy arrays with one row
+    per line of the file. The whole file is parsed at once by string and
+    numpy functions, with no Python code running per line.
+
+    The name of each estimator is split into the name of the operators, e.g.
+    's_z*s_z', which is interned into an integer code in the shared
+    `operator_table`, and the sites, e.g. [12, 13], which are stored in an
+    integer matrix.
+
+    Attributes
+    ----------
+    operators: a list of strings.
+        The names of the estimators without the sites, e.g. 's_z*s_z', found
+        in the file, in order of appearance.
+    codes: a numpy array of ints with shape (n_rows,).
+        The code of the operator of each row, i.e. its id in the
+        `operator_table`.
+    sites: a numpy array of ints with shape (n_rows, n_sites).
+        The sites of each row. `n_sites` is the largest number of single-site
+        operators of all the estimators in the file. Rows for estimators with
+        fewer operators are padded with -1.
+    values: a numpy array of doubles with shape (n_rows,).
+        The value of the estimator in each row.
+
+    Parameters
+    ----------
+    estimators: a list of strings (defaulted to None).
+        If not None, only the rows for these estimators, e.g. 's_z*s_z', are
+        kept. The values and sites of the rest are never converted.
+    parse_cache: a ParseCache (defaulted to None).
+        If not None, the columns are loaded from the cache when the file has
+        not changed since it was cached, and stored in it after parsing the
+        file otherwise. The whole file is cached even if you want only some
+        `estimators`.
+    """
+    def __init__(self, estimators=None, parse_cache=None):
+        super(ColumnarFileReader, self).__init__(estimators)
+        self.parse_cache = parse_cache
+        self.operators = []
+        self.codes = np.zeros(0, dtype=np.int32)
+        self.sites = np.zeros((0, 0), dtype=np.int32)
+        self.values = np.zeros(0, dtype=np.float64)
+
+    def __len__(self):
+        """Returns the number of rows read.
+        """
+        return len(self.values)
+
+    def read(self, filename):
+        """Reads a file and extracts the data.
+
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators file. The file must exist. If you
+            pass a relative path it will be made absolute. The file can be
+            compressed with gzip, bz2, or xz.
+
+        Raises
+        ------
+        DMRGException: if the file does not exist or it is not properly
+        formatted.
+        """
+        if os.path.exists(filename):
+            filename = os.path.abspath(filename)
+        else:
+            raise DMRGException('File does not exist')
+
+        self.filename = filename
+
+        if self.parse_cache is None:
+            with open_estimator_file(filename) as f:
+                self.parse(f.read())
+        elif not self.parse_cache.load(self, filename):
+            with open_estimator_file(filename) as f:
+                self.parse(f.read(), filtered=False)
+            self.parse_cache.store(self, filename)
+            self.keep_only(self.estimators)
+        else:
+            self.keep_only(self.estimators)
+
+        logger.info('File {0} has been read'.format(filename))
+
+    def parse(self, text, filtered=True):
+        """Parses the contents of an estimators file.
+
+        Parameters
+        ----------
+        text: a string.
+            The contents of the file.
+        filtered: a bool (defaulted to True).
+            Whether to keep only the rows for `self.estimators`.
+        """
+        comments, text = split_comments(text)
+        for comment in comments:
+            self.comments.append(comment)
+            self.extract_meta_from_comment(comment)
+
+        shape = blanks_in_line.sub('', token.sub('x', text))
+        if set(shape.split()) - set(['xx']):
+            raise DMRGException('Bad line in file')
+        tokens = text.split()
+        if not tokens:
+            return
+
+        names = tokens[0::2]
+        values = tokens[1::2]
+        signatures = ('\n'.join(names) + '\n').translate(None, string.digits)
+        signatures = signatures.replace('_*', '*').replace('_\n', '\n')
+        operators, codes = intern_operators(signatures.split('\n')[:-1])
+
+        if filtered and self.estimators is not None:
+            operators = [o for o in operators if o in self.estimators]
+            wanted = [operator_table.ids[o] for o in operators]
+            kept = np.flatnonzero(np.in1d(codes, wanted)).tolist()
+            names = [names[i] for i in kept]
+            values = [values[i] for i in kept]
+            codes = codes[kept]
+            if not kept:
+                return
+
+        try:
+            values = np.array(values, dtype=np.float64)
+        except ValueError:
+            raise DMRGException('Bad line in file')
+
+        arities = np.zeros(len(operator_table), dtype=int)
+        for o in operators:
+            arities[operator_table.ids[o]] = o.count('*') + 1
+        arities = arities[codes]
+
+        digits = ('\n'.join(names)).translate(only_digits)
+        if not np.array_equal(count_sites(digits, len(names)), arities):
+            raise DMRGException('Bad operator name')
+        flat_sites = np.fromstring(digits, dtype=np.int32, sep=' ')
+
+        self.operators = operators
+        self.codes = codes
+        self.sites = fill_site_matrix(flat_sites, arities)
+        self.values = values
+
+    def keep_only(self, estimators):
+        """Removes the rows for all estimators but `estimators`.
+
+        Parameters
+        ----------
+        estimators: a list of strings.
+            The estimators to keep, e.g. 's_z*s_z'. If None, all are kept.
+        """
+        if estimators is None:
+            return
+        self.operators = [o for o in self.operators if o in estimators]
+        mask = np.in1d(self.codes, [operator_table.ids[o] 
+                                    for o in self.operators])
+        self.codes = self.codes[mask]
+        self.sites = self.sites[mask]
+        self.values = self.values[mask]
+
+    def select(self, operator):
+        """Selects the rows for an operator.
+
+        Parameters
+        ----------
+        operator: a string.
+            The name of the estimator without the sites, e.g. 's_z*s_z'.
+
+        Returns
+        -------
+        sites: a numpy array of ints with shape (n, arity).
+            The sites of the rows found, without padding.
+        values: a numpy array of doubles with shape (n,).
+            The values of the rows found.
+        """
+        arity = operator.count('*') + 1
+        if operator not in self.operators:
+            return (np.zeros((0, arity), dtype=np.int32),
+                    np.zeros(0, dtype=np.float64))
+        mask = (self.codes == operator_table.ids[operator])
+        return self.sites[mask, :arity], self.values[mask]
+
+def split_comments(text):
+    """Separates the comment lines from the rest of the text.
+
+    Comment lines are few, so you look for them with `str.find` instead of
+    going through all the lines.
+
+    Parameters
+    ----------
+    text: a string.
+        The contents of an estimators file.
+
+    Returns
+    -------
+    comments: a list of strings.
+        The comment lines, including the newline.
+    text: a string.
+        The text without the comment lines.
+    """
+    comments = []
+    pieces = []
+    start = 0
+    position = text.find('#')
+    while position != -1:
+        end = (text.find('\n', position) + 1) or len(text)
+        if position == 0 or text[position - 1] == '\n':
+            pieces.append(text[start:position])
+            comments.append(text[position:end])
+            start = end
+        position = text.find('#', end)
+    pieces.append(text[start:])
+    return comments, ''.join(pieces)
+
+def intern_operators(signatures):
+    """Gets the code in the `operator_table` for the operator of each row.
+
+    Rows for the same operator come often one after the other in the file,
+    so you first keep only the first row of each run of equal names. The
+    different names among these are found by numpy, and only those are
+    looked up in the table.
+
+    Parameters
+    ----------
+    signatures: a list of strings.
+        The operator names, without the sites, of each row.
+
+    Returns
+    -------
+    operators: a list of strings.
+        The different operator names, in order of appearance.
+    codes: a numpy array of ints.
+        For each operator name, its id in the `operator_table`.
+    """
+    signatures = np.array(signatures)
+    starts = np.flatnonzero(signatures[1:] != signatures[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.append(starts, len(signatures)))
+
+    unique, first, inverse = np.unique(signatures[starts], return_index=True,
+                                       return_inverse=True)
+    order = np.argsort(first)
+    operators = [str(s) for s in unique[order]]
+    ids = np.empty(len(unique), dtype=np.int32)
+    ids[order] = [operator_table.operator_id(o) for o in operators]
+    return operators, np.repeat(ids[inverse], lengths)
+
+def count_sites(digits, n_rows):
+    """Counts the sites in each row.
+
+    Parameters
+    ----------
+    digits: a string.
+        The names of the rows, separated by newlines, with everything but
+        the digits and newlines made blank.
+    n_rows: an int.
+        The number of rows.
+
+    Returns
+    -------
+    a numpy array of ints with the number of groups of digits in each row.
+    """
+    chars = np.frombuffer(digits, dtype=np.uint8)
+    is_digit = (chars != ord(' ')) & (chars != ord('\n'))
+    starts = is_digit.copy()
+    starts[1:] &= ~is_digit[:-1]
+    rows = np.cumsum(chars == ord('\n'))
+    return np.bincount(rows[starts], minlength=n_rows)
+
+def fill_site_matrix(flat_sites, arities):
+    """Arranges the sites of all rows in a matrix.
+
+    Parameters
+    ----------
+    flat_sites: a numpy array of ints.
+        The sites of all the rows one after the other.
+    arities: a numpy array of ints.
+        The number of sites of each row.
+
+    Returns
+    -------
+    a numpy array of ints with shape (n_rows, max(arities)), padded with -1.
+    """
+    n_rows = len(arities)
+    sites = np.empty((n_rows, arities.max()), dtype=np.int32)
+    sites.fill(-1)
+    starts = np.cumsum(arities) - arities
+    rows = np.repeat(np.arange(n_rows), arities)
+    columns = np.arange(len(flat_sites)) - np.repeat(starts, arities)
+    sites[rows, columns] = flat_sites
+    return sites
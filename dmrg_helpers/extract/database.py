@@ -4,13 +4,30 @@ from dmrg_helpers.core.dmrg_exceptions import DMRGException
 from dmrg_helpers.core.dmrg_logging import logger
 from dmrg_helpers.extract.tuple_to_key import tuple_to_key
 from dmrg_helpers.extract.estimator import Estimator
-from dmrg_helpers.extract.estimator_name import EstimatorName
-from dmrg_helpers.extract.estimator_site import EstimatorSite
-from dmrg_helpers.extract.process_estimator_name import process_estimator_name
-from dmrg_helpers.extract.reader import FileReader
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.tail_reader import TailFileReader
+from dmrg_helpers.extract.operator_table import operator_table
+from dmrg_helpers.extract.query_builder import (select_estimators, 
+                                                 meta_column)
+from dmrg_helpers.extract.query_cache import QueryCache, make_key
+from contextlib import contextmanager
+from itertools import izip
+import hashlib
+import numpy as np
 import os
 import sqlite3
 
+# The largest number of single-site operators in an estimator. Each gets a
+# column for its site in the estimators table.
+MAX_SITES = 4
+
+# The sqlite settings used while bulk loading: keep the rollback journal in
+# memory, don't wait for the disk to sync, and use a 64 MB page cache. The
+# temporary files used to sort the rows when the indexes are created again
+# stay on disk, otherwise they take as much memory as the whole table.
+bulk_load_pragmas = [('journal_mode', 'memory'), ('synchronous', 'off'),
+                     ('cache_size', -65536)]
+
 def adapt_meta_data(file_reader):
     '''Creates the metadata that label the file.
 
@@ -32,6 +49,68 @@ def adapt_meta_data(file_reader):
     meta_vals = tuple_to_key(x[1] for x in sorted_dict)
     return meta_keys, meta_vals
 
+def group_by_run(operator_ids, run_ids, sites, values):
+    '''Splits the rows of estimators into the rows of each operator and run.
+
+    Parameters
+    ----------
+    operator_ids, run_ids, sites, values: numpy arrays.
+        The columns of the rows, as returned by `Database.fetch_columns`.
+
+    Returns
+    -------
+    a generator of 4-tuples with the id of the operator and the run, and the
+    sites and values of their rows, in the order they were fetched.
+    '''
+    if not len(values):
+        return
+    order = np.lexsort((run_ids, operator_ids))
+    operator_ids, run_ids = operator_ids[order], run_ids[order]
+    sites, values = sites[order], values[order]
+    starts = np.flatnonzero((np.diff(operator_ids) != 0) | 
+                            (np.diff(run_ids) != 0)) + 1
+    bounds = [0] + starts.tolist() + [len(values)]
+    for start, end in izip(bounds[:-1], bounds[1:]):
+        yield (int(operator_ids[start]), int(run_ids[start]), 
+               sites[start:end], values[start:end])
+
+def hash_file(filename):
+    '''Calculates the SHA-1 hash of the contents of a file.
+
+    Parameters
+    ----------
+    filename: a string.
+        The file you want to hash.
+
+    Returns
+    -------
+    a string with the hash in hexadecimal.
+    '''
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), ''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def adapt_estimators(estimators):
+    '''Creates the list of estimators, as stored in the manifest.
+
+    Parameters
+    ----------
+    estimators: a list of strings, a string, or None.
+        The estimators inserted from a file, or None if all were.
+
+    Returns
+    -------
+    a string with the names of the estimators, sorted and joined by the ':'
+    delimiter, or an empty string for all.
+    '''
+    if estimators is None:
+        return ''
+    if isinstance(estimators, basestring):
+        estimators = [estimators]
+    return tuple_to_key(sorted(estimators))
+
 class Database(object):
     """A database to store the estimators
 
@@ -39,64 +118,528 @@ class Database(object):
     estimators. You can extract the data from the database for a given
     estimator and filter them in the ways you please.
 
+    The database has four tables:
+
+    - runs: one row per file inserted, with its filename and its metadata,
+      i.e. the `meta_keys` and `meta_values`. The value of each meta key is
+      also in its own column, e.g. `meta_numberOfSites`, with numeric
+      affinity: values that look like numbers are stored, and compared, as
+      numbers.
+    - operators: one row per estimator name without sites, e.g. 's_z*s_z'.
+    - estimators: one row per line of the files, with the integer ids of
+      its run and operator, the number of sites (the arity), one integer
+      column per site, `site0` to `site3`, and the value. The columns of the
+      sites not used are NULL.
+    - manifest: one row per file inserted with `insert_data_from_file`,
+      with its absolute path, size, modification time, the SHA-1 hash of
+      its contents, the estimators inserted, and the id of its run. You use
+      it to know which files changed since they were inserted.
+
     Parameters
     ----------
     filename: a string.
         The name of the file that will store the database. It's never 
         overwritten.
+    append: a bool (defaulted to False).
+        Whether to open the database in `filename` to add data, if the file
+        exists already. If False, the file must not exist.
+    cache_size: an int (defaulted to 0).
+        The number of estimators kept in `query_cache`, so getting them again
+        does not query the database. If 0, they are not kept.
     meta_keys: a dict of strings on strings.
         The meta comments from the file. It has information about the
         parameters of the Hamiltonian, for example, of the run.
+    query_cache: a QueryCache.
+        The estimators got from the database lately. It's cleared whenever
+        data are inserted or removed.
     """
-    def __init__(self, filename=":memory:"):
+    def __init__(self, filename=":memory:", append=False, cache_size=0):
         self.filename = filename
-        if filename != ":memory:":
-            if os.path.exists(filename):
-                raise DMRGException('Cannot create db: file exists already')
+        exists = filename != ":memory:" and os.path.exists(filename)
+        if exists and not append:
+            raise DMRGException('Cannot create db: file exists already')
         self.meta_keys = None
+        self.tail_readers = {}
+        self.tail_run_ids = {}
+        self.bulk_loading = False
+        self.in_transaction = False
+        self.query_cache = QueryCache(cache_size)
 
-        self.conn = sqlite3.connect(self.filename, 
-                                    detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn = sqlite3.connect(self.filename)
         self.c = self.conn.cursor()
-        self.create_estimators_table()
-        logger.info('Creating database {}'.format(filename))
+        if exists:
+            self.c.execute('select meta_keys from runs limit 1')
+            row = self.c.fetchone()
+            if row is not None:
+                self.meta_keys = row[0]
+            logger.info('Opening database {}'.format(filename))
+        else:
+            self.create_tables()
+            logger.info('Creating database {}'.format(filename))
 
     def __del__(self):
         self.c.close()
         self.conn.close()
 
-    def create_estimators_table(self):
-        '''Creates the table for the estimators.
+    def create_tables(self):
+        '''Creates the tables for the runs, operators, estimators and files.
+        '''
+        site_columns = ', '.join('site{0} integer'.format(i) 
+                                 for i in xrange(MAX_SITES))
+        with self.conn:
+            self.c.execute("create table runs (id integer primary key, \
+                                               filename text, \
+                                               meta_keys text, \
+                                               meta_values text)")
+            self.c.execute("create table operators (id integer primary key, \
+                                                    name text unique)")
+            self.c.execute("create table estimators (run_id integer, \
+                                                     operator_id integer, \
+                                                     arity integer, \
+                                                     {0}, \
+                                                     data real)".format(
+                                                         site_columns))
+            # With the operator first, this index is used both to look up an
+            # estimator by name and by name and run together.
+            self.c.execute("create index estimators_operator_run on \
+                            estimators(operator_id, run_id)")
+            self.c.execute("create table manifest (filename text primary key, \
+                                                   size integer, \
+                                                   mtime real, \
+                                                   hash text, \
+                                                   estimators text, \
+                                                   run_id integer)")
+
+    @contextmanager
+    def bulk_load(self, drop_indexes=True):
+        '''Sets up the database to insert a lot of data fast.
+
+        You use this function in a `with` statement around the insertions of
+        many files. While inside, the sqlite settings in `bulk_load_pragmas`
+        are applied, and the indexes of the estimators table are dropped.
+        When you leave, the indexes are created again, only once for all the
+        data inserted, and the previous settings are restored. If the
+        database is already bulk loading, it does nothing.
+
+        The settings trade safety for speed: if the program crashes while
+        bulk loading, the database file can be left corrupt.
+
+        Parameters
+        ----------
+        drop_indexes: a bool (defaulted to True).
+            Whether to drop the indexes while loading. Creating the indexes
+            again takes a time proportional to all the data in the database,
+            so when you add a few files to a large database, you better keep
+            them.
+
+        Example
+        -------
+        >>> from dmrg_helpers.extract.database import Database
+        >>> db = Database()
+        >>> with db.bulk_load():
+        ...     db.insert_data_from_file('tests/file_one.dat')
+        ...     db.insert_data_from_file('tests/file_two.dat')
         '''
+        if self.bulk_loading:
+            yield
+            return
+
+        previous = [(pragma, self.c.execute('pragma ' + pragma).fetchone()[0])
+                    for pragma, _ in bulk_load_pragmas]
+        indexes = []
+        if drop_indexes:
+            indexes = self.c.execute("select name, sql from sqlite_master \
+                                      where type = 'index' and \
+                                      tbl_name = 'estimators' and \
+                                      sql is not null").fetchall()
         with self.conn:
-            self.c.execute("create table estimators (name estimator_name, \
-                                                     sites estimator_site, \
-                                                     data real, \
-                                                     meta_values text)")
+            for name, _ in indexes:
+                self.c.execute('drop index {0}'.format(name))
+        for pragma, value in bulk_load_pragmas:
+            self.c.execute('pragma {0} = {1}'.format(pragma, value))
+        self.bulk_loading = True
+        try:
+            yield
+        finally:
+            self.bulk_loading = False
+            with self.conn:
+                for _, sql in indexes:
+                    self.c.execute(sql)
+            for pragma, value in previous:
+                self.c.execute('pragma {0} = {1}'.format(pragma, value))
+            logger.info('Bulk load in database {0} done'.format(self.filename))
+
+    @contextmanager
+    def transaction(self):
+        '''Makes the changes to the database inside a single transaction.
+
+        You use this function in a `with` statement, as `with self.conn`: the
+        changes are committed when you leave, or rolled back if there is an
+        exception. Unlike `with self.conn`, the transactions inside another
+        one are part of it, so nothing is committed until you leave the
+        outermost.
+        '''
+        if self.in_transaction:
+            yield
+            return
+
+        self.in_transaction = True
+        try:
+            with self.conn:
+                yield
+        finally:
+            self.in_transaction = False
 
-    def insert_data_from_file(self, filename):
+    def insert_data_from_file(self, filename, estimators=None, 
+                              parse_cache=None):
         '''Insert into the database the data in `filename`.
 
+        If the file was inserted before, its old data are replaced. If the
+        file cannot be read or inserted, the old data are kept.
+
         Parameters
         ----------
         filename: a string.
             The filename of the estimators.dat file to be read. The path can be
             relative or absolute.
+        estimators: a list of strings (defaulted to None).
+            If not None, only the data for these estimators, e.g. 's_z*s_z',
+            are inserted. The rest of the file is skipped while reading.
+        parse_cache: a ParseCache (defaulted to None).
+            If not None, the cache used to avoid parsing unchanged files.
         '''
-        file_reader = FileReader()
+        file_reader = ColumnarFileReader(estimators, parse_cache)
         file_reader.read(filename)
-        meta_keys, meta_vals = adapt_meta_data(file_reader)
-        self.check_meta_keys(meta_keys)
+        stat = os.stat(filename)
+        file_hash = hash_file(filename)
+        # Creating the indexes again would take a time proportional to all
+        # the data in the database, so they are dropped only by the callers
+        # inserting many files. The file is parsed before removing its old
+        # data, and these are replaced in a single transaction, so if
+        # anything goes wrong the old data are still there.
+        with self.bulk_load(drop_indexes=False):
+            with self.transaction():
+                self.remove_file(filename)
+                run_id = self.insert_columnar_data(file_reader)
+                self.insert_in_manifest(file_reader.filename, stat.st_size, 
+                                        stat.st_mtime, file_hash, 
+                                        estimators, run_id)
+
+    def insert_in_manifest(self, filename, size, mtime, file_hash, estimators,
+                           run_id):
+        '''Records in the manifest a file inserted in the database.
+
+        Parameters
+        ----------
+        filename: a string.
+            The absolute path of the estimators file.
+        size: an int.
+            The size of the file in bytes.
+        mtime: a float.
+            The modification time of the file.
+        file_hash: a string.
+            The SHA-1 hash of the contents of the file, as from `hash_file`.
+        estimators: a list of strings.
+            The estimators inserted from the file, or None if all were.
+        run_id: an int.
+            The id of the run where the data of the file are.
+        '''
+        with self.transaction():
+            self.c.execute('insert into manifest(filename, size, mtime, hash, \
+                            estimators, run_id) values(?,?,?,?,?,?)',
+                           (filename, size, mtime, file_hash, 
+                            adapt_estimators(estimators), run_id))
+
+    def number_of_runs(self):
+        '''Returns the number of runs in the database.
+        '''
+        self.c.execute('select count(*) from runs')
+        return self.c.fetchone()[0]
+
+    def is_up_to_date(self, filename, estimators=None):
+        '''Checks whether the data of a file in the database are up to date.
+
+        A file is up to date if it was inserted for the same `estimators`
+        and its contents have not changed since. If the size and modification
+        time of the file are the ones in the manifest, you don't look further.
+        Otherwise the hash of its contents is compared; if it is the same,
+        e.g. the file was just touched, the manifest is updated.
 
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators.dat file. The path can be relative
+            or absolute.
+        estimators: a list of strings (defaulted to None).
+            The estimators you want from the file, or None for all.
+
+        Returns
+        -------
+        a bool: whether you can skip inserting the file again.
+        '''
+        path = os.path.abspath(filename)
+        self.c.execute('select size, mtime, hash, estimators from manifest \
+                        where filename = ?', (path,))
+        row = self.c.fetchone()
+        if row is None or row[3] != adapt_estimators(estimators):
+            return False
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime) == row[:2]:
+            return True
+        if stat.st_size != row[0] or hash_file(path) != row[2]:
+            return False
         with self.conn:
-            for line in file_reader.data:
-                n, s = process_estimator_name(line[0])
-                n = EstimatorName(n)
-                s = EstimatorSite(s)
-                d = line[1]
-                self.c.execute("insert into estimators(\
-                     name, sites, data, meta_values) values(?,?,?,?)", 
-                     (n, s, d, meta_vals))
+            self.c.execute('update manifest set mtime = ? where filename = ?',
+                           (stat.st_mtime, path))
+        return True
+
+    def remove_file(self, filename):
+        '''Removes from the database all the data inserted from a file.
+
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators.dat file. The path can be relative
+            or absolute. If it is not in the manifest, nothing happens.
+        '''
+        path = os.path.abspath(filename)
+        self.c.execute('select run_id from manifest where filename = ?', 
+                       (path,))
+        row = self.c.fetchone()
+        if row is None:
+            return
+        with self.transaction():
+            self.remove_run(row[0])
+            self.c.execute('delete from manifest where filename = ?', (path,))
+        logger.info('File {0} removed from database {1}'.format(
+            path, self.filename))
+
+    def remove_run(self, run_id):
+        '''Removes from the database a run and all its data.
+
+        Parameters
+        ----------
+        run_id: an int.
+            The id of the run.
+        '''
+        self.query_cache.clear()
+        with self.transaction():
+            # Going through the operators lets sqlite use the index on
+            # (operator_id, run_id) instead of scanning the whole table.
+            self.c.execute('delete from estimators where operator_id in \
+                            (select id from operators) and run_id = ?', 
+                           (run_id,))
+            self.c.execute('delete from runs where id = ?', (run_id,))
+
+    def insert_appended_data_from_file(self, filename, estimators=None):
+        '''Insert into the database the data appended to `filename`.
+
+        You use this function to follow an estimators file that a running
+        DMRG program is still writing. The first time you call it for a file,
+        all the data in the file are inserted; the next times, only the data
+        appended to the file since the previous call. The partial line at the
+        end of the file, if any, waits for the next call.
+
+        If the file has been truncated since the previous call, it is read
+        again from the beginning, and the rows inserted before for it are
+        removed.
+
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators.dat file to be read. The path can be
+            relative or absolute. It cannot be compressed.
+        estimators: a list of strings (defaulted to None).
+            If not None, only the data for these estimators, e.g. 's_z*s_z',
+            are inserted. Only used the first time you call this function for
+            a file.
+
+        Returns
+        -------
+        an int with the number of rows inserted.
+        '''
+        path = os.path.abspath(filename)
+        if path not in self.tail_readers:
+            self.tail_readers[path] = TailFileReader(estimators)
+        file_reader = self.tail_readers[path]
+        file_reader.read(path)
+        run_id = self.tail_run_ids.get(path)
+        if file_reader.restarted and run_id is not None:
+            self.query_cache.clear()
+            with self.conn:
+                self.c.execute('delete from estimators where run_id = ?', 
+                               (run_id,))
+        if len(file_reader):
+            self.tail_run_ids[path] = self.insert_columnar_data(file_reader, 
+                                                                run_id)
+        return len(file_reader)
+
+    def insert_columnar_data(self, columnar_reader, run_id=None):
+        '''Insert into the database the data read by a ColumnarFileReader.
+
+        The rows are inserted straight from the columns of the reader, without
+        creating any EstimatorName or EstimatorSite objects.
+
+        Parameters
+        ----------
+        columnar_reader: a ColumnarFileReader.
+            A reader that has already read an estimators file.
+        run_id: an int (defaulted to None).
+            The id of the run the data belong to, if they are to be added to
+            a run already in the database. If None, a new run is created.
+
+        Returns
+        -------
+        an int with the id of the run.
+
+        Raises
+        ------
+        DMRGException: if the meta_keys of the file are not the ones in the
+        database, or an estimator has more than MAX_SITES sites.
+        '''
+        meta_keys, meta_vals = adapt_meta_data(columnar_reader)
+        operators = columnar_reader.operators
+        operator_ids = np.zeros(len(operator_table), dtype=int)
+        with self.transaction():
+            run_id = self.insert_run(columnar_reader.filename, meta_keys, 
+                                     meta_vals, run_id)
+            operator_ids[[operator_table.ids[o] for o in operators]] = (
+                self.insert_operators(operators))
+            self.insert_rows(run_id, operator_ids[columnar_reader.codes],
+                             columnar_reader.sites, columnar_reader.values)
+        return run_id
+
+    def insert_run(self, filename, meta_keys, meta_vals, run_id=None):
+        '''Insert into the database a run, i.e. the metadata of a file.
+
+        Parameters
+        ----------
+        filename: a string.
+            The absolute path of the estimators file.
+        meta_keys: a string.
+            The meta_keys after adapting them.
+        meta_vals: a string.
+            The meta_values after adapting them.
+        run_id: an int (defaulted to None).
+            If not None, the id of a run already in the database, whose
+            metadata are updated instead.
+
+        Returns
+        -------
+        an int with the id of the run.
+
+        Raises
+        ------
+        DMRGException: if the meta_keys of the file are not the ones in the
+        database.
+        '''
+        self.query_cache.clear()
+        self.check_meta_keys(meta_keys)
+        columns = map(meta_column, self.get_meta_keys())
+        values = meta_vals.split(':') if columns else []
+        if run_id is None:
+            self.c.execute('insert into runs(filename, meta_keys, \
+                            meta_values{0}) values(?,?,?{1})'.format(
+                                ''.join(', ' + c for c in columns), 
+                                ',?' * len(columns)), 
+                           [filename, meta_keys, meta_vals] + values)
+            run_id = self.c.lastrowid
+        else:
+            self.c.execute('update runs set meta_values = ?{0} where \
+                            id = ?'.format(''.join(', {0} = ?'.format(c) 
+                                                   for c in columns)),
+                           [meta_vals] + values + [run_id])
+        return run_id
+
+    def insert_rows(self, run_id, operator_ids, sites, values):
+        '''Insert into the database rows of estimators for a run.
+
+        Parameters
+        ----------
+        run_id: an int.
+            The id of the run the rows belong to.
+        operator_ids: a numpy array of ints with shape (n_rows,).
+            The id in the operators table of each row.
+        sites: a numpy array of ints with shape (n_rows, n_sites).
+            The sites of each row, padded with -1, as in a ColumnarFileReader.
+        values: a numpy array of doubles with shape (n_rows,).
+            The value of each row.
+
+        Raises
+        ------
+        DMRGException: if an estimator has more than MAX_SITES sites.
+        '''
+        if sites.shape[1] > MAX_SITES:
+            raise DMRGException('Too many sites in an estimator')
+        self.query_cache.clear()
+
+        # The rows with the same number of sites are inserted together.
+        # The run, the arity and the NULL sites are the same for all of
+        # them, so they go in the statement instead of in each row.
+        arities = (sites >= 0).sum(axis=1)
+        site_columns = ', '.join('site{0}'.format(i) 
+                                 for i in xrange(MAX_SITES))
+        for arity in np.unique(arities).tolist():
+            mask = (arities == arity)
+            placeholders = ([str(run_id), '?', str(arity)] + ['?'] * arity + 
+                            ['NULL'] * (MAX_SITES - arity) + ['?'])
+            insert = 'insert into estimators(run_id, operator_id, arity, \
+                      {0}, data) values({1})'.format(site_columns,
+                                                    ','.join(placeholders))
+            columns = ([operator_ids[mask].tolist()] +
+                       [sites[mask, i].tolist() for i in xrange(arity)] +
+                       [values[mask].tolist()])
+            self.c.executemany(insert, izip(*columns))
+
+    def insert_operators(self, names):
+        '''Gets the ids of operators in the database, inserting the new ones.
+
+        Parameters
+        ----------
+        names: a list of strings.
+            The names of the estimators without the sites, e.g. 's_z*s_z'.
+
+        Returns
+        -------
+        a numpy array of ints with the id in the operators table of each
+        name.
+        '''
+        return np.array([self.insert_operator(o) for o in names], dtype=int)
+
+    def insert_operator(self, name):
+        '''Gets the id of an operator in the database, inserting it if new.
+
+        Parameters
+        ----------
+        name: a string.
+            The name of the estimator without the sites, e.g. 's_z*s_z'.
+
+        Returns
+        -------
+        an int with the id of the operator in the operators table.
+        '''
+        operator_id = self.get_operator_id(name)
+        if operator_id is None:
+            self.c.execute('insert into operators(name) values(?)', (name,))
+            operator_id = self.c.lastrowid
+        return operator_id
+
+    def get_operator_id(self, name):
+        '''Gets the id of an operator in the database.
+
+        Parameters
+        ----------
+        name: a string.
+            The name of the estimator without the sites, e.g. 's_z*s_z'.
+
+        Returns
+        -------
+        an int with the id of the operator in the operators table, or None if
+        the operator is not in the database.
+        '''
+        self.c.execute('select id from operators where name = ?', (name,))
+        row = self.c.fetchone()
+        return row[0] if row is not None else None
 
     def check_meta_keys(self, meta_keys):
         '''Checks whether the `meta_keys` for the file are alright.
@@ -111,12 +654,26 @@ class Database(object):
         '''
         if self.meta_keys is None:
             self.meta_keys = meta_keys
+            for key in self.get_meta_keys():
+                self.c.execute('alter table runs add column {0} numeric'.format(
+                    meta_column(key)))
         elif self.meta_keys != meta_keys:
             raise DMRGException('Incompatible file: meta_keys are different')
         else:
             pass
 
-    def get_estimator(self, estimator_name, site_expression=None):
+    def get_meta_keys(self):
+        '''Returns the meta keys of the data in the database.
+
+        Returns
+        -------
+        a list of strings, empty if there are no data or no metadata.
+        '''
+        if not self.meta_keys:
+            return []
+        return self.meta_keys.split(':')
+
+    def get_estimator(self, estimator_name, site_expression=None, meta=None):
         '''Gets an estimator from the database.
 
         You use this function to get the values for particular estimators from 
@@ -126,17 +683,160 @@ class Database(object):
         ----------
         estimator_name: a string.
             The operators acting in each site, in order, and separated by '*'.
-        site_expression: a string.
-            Not implemented right now.
+        site_expression: a list of strings (defaulted to None).
+            If not None, you get only the data for the sites that match
+            these expressions, one per site of the estimator, e.g. ['i',
+            'i+1'] for nearest neighbours, or ['0', 'i'] for the correlations
+            with the first site. The expressions are the ones in
+            `generate_indexes`. The data are filtered by the database, see
+            `query_builder.site_predicate`.
+        meta: a dict (defaulted to None).
+            If not None, you get only the data of the runs whose metadata
+            match. The keys are meta keys, and the values either the value
+            the key must have, e.g. {'numberOfSites': 96}, or a 2-tuple with
+            the smallest and largest values, e.g. {'Kring': (0.0, 0.5)}. The
+            runs are filtered by the database, see
+            `query_builder.meta_predicate`.
 
         Returns
         -------
         result: an Estimator object with all the data found for this
         estimator.
         '''
-        n = EstimatorName(estimator_name.split('*'))
-        self.c.execute('select * from estimators where name = ?', (n,))
-        fetched = self.c.fetchall()
-        result = Estimator(estimator_name, self.meta_keys)
-        result.add_fetched_data(fetched)
-        return result
+        return self.get_estimators([estimator_name], site_expression, meta)[0]
+
+    def get_estimators(self, estimator_names, site_expression=None, 
+                       meta=None):
+        '''Gets several estimators from the database at once.
+
+        You use this function instead of calling `get_estimator` for each of
+        the estimators you need: all of them are fetched with a single query,
+        and the rows are sorted out into an Estimator for each.
+
+        Parameters
+        ----------
+        estimator_names: a list of strings.
+            The operators acting in each site, in order, and separated by '*',
+            for each of the estimators.
+        site_expression: a list of strings (defaulted to None).
+            As in `get_estimator`. All the estimators must have as many sites
+            as expressions.
+        meta: a dict (defaulted to None).
+            As in `get_estimator`.
+
+        Returns
+        -------
+        result: a list with an Estimator object for each of the
+        `estimator_names`, in the same order. If the database has a cache,
+        the estimators may be shared with other callers: don't modify them.
+
+        Example
+        -------
+        >>> from dmrg_helpers.extract.database import Database
+        >>> db = Database()
+        >>> db.insert_data_from_file('tests/real_data/static/estimators.dat')
+        >>> n_n, n = db.get_estimators(['n*n', 'n'])
+        '''
+        meta_keys = self.get_meta_keys()
+        for key in (meta or {}):
+            if key not in meta_keys:
+                raise DMRGException('Bad meta key: {0}'.format(key))
+        result = {}
+        for name in estimator_names:
+            if name not in result:
+                key = make_key(name, site_expression, meta)
+                result[name] = self.query_cache.get(key)
+        missing = [name for name, estimator in result.iteritems() 
+                   if estimator is None]
+        for name in missing:
+            result[name] = Estimator(name, self.meta_keys)
+
+        # the name of the estimator by id
+        found = {}
+        for name in missing:
+            operator_id = self.get_operator_id(name)
+            if operator_id is not None:
+                found[operator_id] = name
+        if found:
+            self.c.execute('select id, meta_values from runs')
+            meta_values = dict(self.c.fetchall())
+            columns = self.fetch_columns(*select_estimators(
+                found.values(), site_expression=site_expression, meta=meta))
+            for operator_id, run_id, sites, values in group_by_run(*columns):
+                name = found[operator_id]
+                arity = name.count('*') + 1
+                result[name].add_columns(sites[:, :arity], values, 
+                                         meta_values[run_id])
+        for name in missing:
+            self.query_cache.put(make_key(name, site_expression, meta), 
+                                 result[name])
+        return [result[name] for name in estimator_names]
+
+    def fetch_columns(self, sql, params=(), chunk_size=8192):
+        '''Runs a query for estimators and returns the rows as arrays.
+
+        The rows are fetched in chunks, each made into an array at once, and
+        the arrays joined at the end, so the query runs only once and no
+        Python objects are kept for each row.
+
+        Parameters
+        ----------
+        sql: a string.
+            A query from `query_builder.select_estimators`.
+        params: a tuple (defaulted to empty).
+            The parameters for the placeholders in the query.
+        chunk_size: an int (defaulted to 8192).
+            The number of rows fetched at a time.
+
+        Returns
+        -------
+        operator_ids: a numpy array of ints with shape (n_rows,).
+        run_ids: a numpy array of ints with shape (n_rows,).
+        sites: a numpy array of ints with shape (n_rows, n_sites).
+            The sites of each row, padded with -1.
+        values: a numpy array of doubles with shape (n_rows,).
+        '''
+        self.c.execute(sql, params)
+        # the NULL sites come as nan
+        chunks = [np.empty((0, len(self.c.description)), dtype=np.float64)]
+        while True:
+            chunk = self.c.fetchmany(chunk_size)
+            if not chunk:
+                break
+            chunks.append(np.array(chunk, dtype=np.float64))
+        rows = np.concatenate(chunks)
+        sites = rows[:, 2:-1]
+        sites[np.isnan(sites)] = -1
+        return (rows[:, 0].astype(int), rows[:, 1].astype(int), 
+                sites.astype(np.int32), rows[:, -1].copy())
+
+    def explain(self, sql, params=()):
+        '''Shows how sqlite runs a query.
+
+        You use this function to check whether a query uses the indexes or
+        scans the whole table.
+
+        Parameters
+        ----------
+        sql: a string.
+            The query, e.g. one from `query_builder`.
+        params: a tuple (defaulted to empty).
+            The parameters for the placeholders in the query.
+
+        Returns
+        -------
+        a list of strings with the steps of the query plan.
+
+        Example
+        -------
+        >>> from dmrg_helpers.extract.database import Database
+        >>> from dmrg_helpers.extract.query_builder import select_estimator
+        >>> db = Database()
+        >>> for step in db.explain(*select_estimator('n*n')):
+        ...     print step
+        SEARCH estimators USING INDEX estimators_operator_run (operator_id=?)
+        LIST SUBQUERY 1
+        SEARCH operators USING COVERING INDEX sqlite_autoindex_operators_1 (name=?)
+        '''
+        self.c.execute('explain query plan ' + sql, params)
+        return [row[-1] for row in self.c.fetchall()]
@@ -3,55 +3,148 @@
 import numpy as np
 import os
 from itertools import izip
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
 from dmrg_helpers.extract.estimator_site import EstimatorSite
+from dmrg_helpers.extract.site_alignment import align_sites
 from dmrg_helpers.view.xy_data import XYDataDict
 
 class EstimatorData(object):
     """An auxiliary class to hold the numerical data from an Estimator.
 
     Estimators contain numerical data and you use this class to store them. 
+
+    The sites are kept in an array of int32 with a row per value, and the
+    values in an array of doubles. The arrays grow as you add data, doubling
+    their size when they are full, so adding data one by one is cheap. The
+    arrays you get from `sites_as_np`, `x_as_np` and `y_as_np` are read-only
+    views of these, made once until more data are added.
     
-    Parameters
+    Attributes
     ----------
-    sites_list: an list of tuples of ints.
+    sites_list: a list of EstimatorSite.
         The sites at which each of the single-site operators of the correlator
         act.
-    values_list: an list of doubles.
+    values_list: a list of doubles.
         The value of the correlator at each site in the sites_list.
     """
+    __slots__ = ('_sites', '_values', '_size', '_views')
+
     def __init__(self):
-        self.sites_list = []
-        self.values_list = []
+        self._sites = None
+        self._values = np.zeros(0, dtype=np.float64)
+        self._size = 0
+        self._views = {}
+
+    def __len__(self):
+        return self._size
+
+    def reserve(self, size, arity):
+        """Makes room for `size` values in total.
+
+        Parameters
+        ----------
+        size: an int.
+            The number of values the arrays must be able to hold.
+        arity: an int.
+            The number of sites of the estimator.
+        """
+        if self._sites is None:
+            self._sites = np.zeros((0, arity), dtype=np.int32)
+        elif self._sites.shape[1] != arity:
+            raise DMRGException('Wrong number of sites')
+        if size > len(self._values):
+            capacity = max(size, 2 * len(self._values), 16)
+            sites = np.empty((capacity, arity), dtype=np.int32)
+            sites[:self._size] = self._sites[:self._size]
+            values = np.empty(capacity, dtype=np.float64)
+            values[:self._size] = self._values[:self._size]
+            self._sites, self._values = sites, values
+        if self._views:
+            self._views = {}
 
     def add(self, sites, value):
-        """Adds data"""
-        self.sites_list.append(sites)
-        self.values_list.append(value)
+        """Adds data
+
+        Parameters
+        ----------
+        sites: an EstimatorSite, or a tuple of ints (or strings).
+            The sites for the value.
+        value: a double.
+            The value of the correlator.
+        """
+        sites = getattr(sites, 'sites', sites)
+        self.reserve(self._size + 1, len(sites))
+        self._sites[self._size] = map(int, sites)
+        self._values[self._size] = value
+        self._size += 1
+
+    def extend(self, sites, values):
+        """Adds data in columns.
+
+        Parameters
+        ----------
+        sites: a numpy array of ints with shape (n, arity).
+            The sites for each of the values.
+        values: a numpy array of doubles with shape (n,).
+            The values of the correlator.
+        """
+        end = self._size + len(values)
+        self.reserve(end, sites.shape[1])
+        self._sites[self._size:end] = sites
+        self._values[self._size:end] = values
+        self._size = end
+
+    def view(self, name, make):
+        """Returns a read-only view of the data, made only once.
+        """
+        if name not in self._views:
+            array = make()
+            array.flags.writeable = False
+            self._views[name] = array
+        return self._views[name]
+
+    @property
+    def sites_list(self):
+        return map(EstimatorSite, self.sites())
+
+    @property
+    def values_list(self):
+        return self.y()
     
     def sites(self):
         """Returns the sites a list of tuples
         """
-        return [i.sites for i in self.sites_list]
+        return map(tuple, self.sites_as_np().tolist())
+
+    def sites_as_np(self):
+        """Returns the sites as a numpy array with a row for each value.
+        """
+        if self._sites is None:
+            return self.view('sites', 
+                             lambda: np.zeros((0, 0), dtype=np.int32))
+        return self.view('sites', lambda: self._sites[:self._size])
 
     def x(self):
         """Returns the first site as an index of the chain in a list
         """
-        return map(EstimatorSite.x, self.sites_list)
+        return self.x_as_np().tolist()
 
     def x_as_np(self):
         """Returns the first site as an index of the chain in a numpy array.
         """
-        return np.array(map(EstimatorSite.x, self.sites_list), dtype=int)
+        if self._sites is None:
+            return self.view('x', lambda: np.zeros(0, dtype=np.int32))
+        return self.view('x', lambda: self._sites[:self._size, 0])
     
     def y(self):
         """Returns the values as a list.
         """
-        return self.values_list
+        return self.y_as_np().tolist()
 
     def y_as_np(self):
         """Returns the values as a numpy array.
         """
-        return np.array(self.values_list, dtype=float)
+        return self.view('y', lambda: self._values[:self._size])
 
 class Estimator(object):
     """A class for storing data for estimators once retrieved for a database.
@@ -93,6 +186,109 @@ class Estimator(object):
         """
         return len(self.data)
 
+    def __add__(self, other):
+        """Adds two estimators, site by site.
+
+        The data for each set of parameters are matched by their sites, and
+        only the sites in both estimators are kept. The parameters in only
+        one of the estimators are dropped.
+
+        Example
+        -------
+        >>> from dmrg_helpers.extract.database import Database
+        >>> db = Database()
+        >>> db.insert_data_from_file('tests/real_data/static/estimators.dat')
+        >>> uu, dd, ud, du = db.get_estimators(['n_up*n_up', 'n_down*n_down',
+        ...                                     'n_up*n_down', 'n_down*n_up'])
+        >>> n_n = uu + dd + ud + du
+        >>> s_z_s_z = 0.25 * (uu + dd - ud - du)
+        """
+        if not isinstance(other, Estimator):
+            return NotImplemented
+        return self.combine(other, np.add, '+')
+
+    def __radd__(self, other):
+        """Adds 0 to the estimator, so you can add estimators with `sum`.
+
+        Adding any other number is not supported.
+        """
+        if isinstance(other, (int, long, float)) and other == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        """Subtracts two estimators, site by site, as in `__add__`.
+        """
+        if not isinstance(other, Estimator):
+            return NotImplemented
+        return self.combine(other, np.subtract, '-')
+
+    def __mul__(self, other):
+        """Multiplies the estimator by a number, or by another estimator.
+
+        Two estimators are multiplied site by site, as in `__add__`.
+        """
+        if isinstance(other, Estimator):
+            return self.combine(other, np.multiply, '*')
+        if isinstance(other, (int, long, float)):
+            return self.scale(other)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if isinstance(other, (int, long, float)):
+            return self.scale(other)
+        return NotImplemented
+
+    def __neg__(self):
+        return self.scale(-1.0)
+
+    def scale(self, factor):
+        """Returns a new estimator with the values multiplied by a number.
+
+        Parameters
+        ----------
+        factor: a number.
+        """
+        result = Estimator('{0}*({1})'.format(factor, self.name), 
+                           self.meta_keys)
+        for key, data in self.data.iteritems():
+            result.add_columns(data.sites_as_np(), factor * data.y_as_np(), 
+                               key)
+        return result
+
+    def combine(self, other, operation, symbol):
+        """Returns a new estimator combining this one and another site by site.
+
+        Parameters
+        ----------
+        other: an Estimator.
+            The other estimator, with the same meta_keys and number of sites.
+        operation: a numpy ufunc.
+            The operation that combines the values, e.g. np.add.
+        symbol: a string.
+            The symbol of the operation, used for the name of the result.
+
+        Raises
+        ------
+        DMRGException: if the estimators have different meta_keys or number
+        of sites.
+        """
+        if self.meta_keys != other.meta_keys:
+            raise DMRGException('Estimators with different meta keys')
+        result = Estimator('({0}){1}({2})'.format(self.name, symbol, 
+                                                  other.name), 
+                           self.meta_keys)
+        for key, data in self.data.iteritems():
+            if key not in other.data:
+                continue
+            other_data = other.data[key]
+            indexes, other_indexes = align_sites(data.sites_as_np(), 
+                                                 other_data.sites_as_np())
+            values = operation(data.y_as_np()[indexes], 
+                               other_data.y_as_np()[other_indexes])
+            result.add_columns(data.sites_as_np()[indexes], values, key)
+        return result
+
     def get_metadata_as_dict(self, meta_val):
         """Returns a dictionary with metadata.
         
@@ -118,6 +314,39 @@ class Estimator(object):
                 self.data[meta_vals] = EstimatorData()
             self.data[meta_vals].add(d[1], d[2])
 
+    def add_columnar_data(self, columnar_reader, meta_vals):
+        """Adds data from a ColumnarFileReader to the Estimator.
+
+        You use this function to get an estimator straight from a file you
+        have read, without going through the database.
+
+        Parameters
+        ----------
+        columnar_reader : a ColumnarFileReader.
+            A reader that has already read an estimators file.
+        meta_vals : a string.
+            The values of the meta_keys for the data in the reader.
+        """
+        sites, values = columnar_reader.select(self.name)
+        self.add_columns(sites, values, meta_vals)
+
+    def add_columns(self, sites, values, meta_vals):
+        """Adds data in columns to the Estimator.
+
+        Parameters
+        ----------
+        sites: a numpy array of ints with shape (n, arity).
+            The sites for each of the values.
+        values: a numpy array of doubles with shape (n,).
+            The values of the correlator.
+        meta_vals : a string.
+            The values of the meta_keys for the data.
+        """
+        if len(values):
+            if meta_vals not in self.data:
+                self.data[meta_vals] = EstimatorData()
+            self.data[meta_vals].extend(sites, values)
+
     def save(self, filename, output_dir=os.getcwd()):
         """Saves the correlator data to a file.
 
@@ -0,0 +1,204 @@
+'''Lazy expressions of estimators, evaluated against a database.
+'''
+from abc import ABCMeta, abstractmethod
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.estimator import Estimator
+from dmrg_helpers.extract.site_alignment import align_sites
+
+class EstimatorExpression(object):
+    """A combination of estimators, to be got from a database later.
+
+    You use this class to write combinations of estimators, like
+    `zz + 0.5 * (pm + mp)`, before getting the estimators from the database.
+    Nothing is computed when you write the expression: it just records the
+    operations. When you call `evaluate`, the estimators in the expression
+    are got from the database with a single query, their data are aligned on
+    the sites once, and the whole expression is computed on arrays, for each
+    set of parameters. No intermediate estimators are made, as when you
+    combine Estimator objects.
+
+    You don't create objects of this class, but use `LazyEstimator` for the
+    estimators, and the arithmetic operators (`+`, `-`, `*`, and numbers)
+    to combine them.
+
+    The subclasses define `estimator_names` and `compute`, used by
+    `evaluate`.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.database import Database
+    >>> from dmrg_helpers.extract.estimator_expression import LazyEstimator
+    >>> uu, dd, ud, du = map(LazyEstimator, ['n_up*n_up', 'n_down*n_down',
+    ...                                      'n_up*n_down', 'n_down*n_up'])
+    >>> s_z_s_z = 0.25 * (uu + dd - ud - du)
+    >>> print s_z_s_z
+    0.25 * (((n_up*n_up + n_down*n_down) - n_up*n_down) - n_down*n_up)
+    >>> db = Database()
+    >>> db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    >>> s_z_s_z = s_z_s_z.evaluate(db)
+    """
+    __metaclass__ = ABCMeta
+
+    def __add__(self, other):
+        return Operation.make(np.add, '+', self, other)
+
+    def __radd__(self, other):
+        return Operation.make(np.add, '+', other, self)
+
+    def __sub__(self, other):
+        return Operation.make(np.subtract, '-', self, other)
+
+    def __rsub__(self, other):
+        return Operation.make(np.subtract, '-', other, self)
+
+    def __mul__(self, other):
+        return Operation.make(np.multiply, '*', self, other)
+
+    def __rmul__(self, other):
+        return Operation.make(np.multiply, '*', other, self)
+
+    def __neg__(self):
+        return Operation(np.negative, '-', self)
+
+    @abstractmethod
+    def estimator_names(self):
+        """Returns the set of the names of the estimators in the expression.
+        """
+
+    @abstractmethod
+    def compute(self, values):
+        """Computes the expression on arrays.
+
+        Parameters
+        ----------
+        values: a dict of strings on numpy arrays.
+            The values of each estimator, aligned on their sites.
+
+        Returns
+        -------
+        a numpy array, or a number for a constant expression.
+        """
+
+    def evaluate(self, db, site_expression=None, meta=None):
+        """Gets the estimators from a database and computes the expression.
+
+        Only the sets of parameters that all the estimators have, and the
+        sites that all of them have for each set, are kept.
+
+        Parameters
+        ----------
+        db: a Database.
+            The database with the estimators.
+        site_expression: a list of strings (defaulted to None).
+            As in `Database.get_estimator`.
+        meta: a dict (defaulted to None).
+            As in `Database.get_estimator`.
+
+        Returns
+        -------
+        an Estimator with the result.
+
+        Raises
+        ------
+        DMRGException: if there are no estimators in the expression, or they
+        have different number of sites.
+        """
+        names = sorted(self.estimator_names())
+        if not names:
+            raise DMRGException('No estimators in the expression')
+        estimators = db.get_estimators(names, site_expression, meta)
+        result = Estimator(str(self), db.meta_keys)
+        keys = set.intersection(*[set(e.data) for e in estimators])
+        for key in keys:
+            data = [e.data[key] for e in estimators]
+            indexes = align_sites(*[d.sites_as_np() for d in data])
+            values = dict((name, d.y_as_np()[i])
+                          for name, d, i in zip(names, data, indexes))
+            result.add_columns(data[0].sites_as_np()[indexes[0]],
+                               self.compute(values), key)
+        return result
+
+class LazyEstimator(EstimatorExpression):
+    """An estimator in an expression, got from the database by its name.
+
+    Parameters
+    ----------
+    name: a string.
+        The operators acting in each site, in order, and separated by '*'.
+    """
+    def __init__(self, name):
+        super(LazyEstimator, self).__init__()
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    def estimator_names(self):
+        return set([self.name])
+
+    def compute(self, values):
+        return values[self.name]
+
+class Constant(EstimatorExpression):
+    """A number in an expression.
+    """
+    def __init__(self, value):
+        super(Constant, self).__init__()
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+    def estimator_names(self):
+        return set()
+
+    def compute(self, values):
+        return self.value
+
+class Operation(EstimatorExpression):
+    """An operation on expressions.
+
+    Parameters
+    ----------
+    operation: a numpy ufunc.
+        The operation, e.g. np.add.
+    symbol: a string.
+        The symbol of the operation, used to print it.
+    operands: EstimatorExpression objects.
+        One or two operands.
+    """
+    def __init__(self, operation, symbol, *operands):
+        super(Operation, self).__init__()
+        self.operation = operation
+        self.symbol = symbol
+        self.operands = operands
+
+    @classmethod
+    def make(cls, operation, symbol, left, right):
+        """Makes an operation on two operands, which can be numbers.
+
+        Returns NotImplemented if an operand is not a number nor an
+        expression, so Python can try other ways.
+        """
+        operands = []
+        for operand in (left, right):
+            if isinstance(operand, (int, long, float)):
+                operand = Constant(operand)
+            elif not isinstance(operand, EstimatorExpression):
+                return NotImplemented
+            operands.append(operand)
+        return cls(operation, symbol, *operands)
+
+    def __str__(self):
+        operands = [str(o) if isinstance(o, (LazyEstimator, Constant))
+                    else '({0})'.format(o) for o in self.operands]
+        if len(operands) == 1:
+            return self.symbol + operands[0]
+        return ' {0} '.format(self.symbol).join(operands)
+
+    def estimator_names(self):
+        return set.union(*[o.estimator_names() for o in self.operands])
+
+    def compute(self, values):
+        return self.operation(*[o.compute(values) for o in self.operands])
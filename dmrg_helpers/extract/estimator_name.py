@@ -1,5 +1,6 @@
 '''A class for estimator names.
 '''
+from dmrg_helpers.extract.operator_table import operator_table
 from dmrg_helpers.extract.tuple_to_key import tuple_to_key
 from sqlite3 import register_adapter, register_converter
 
@@ -13,10 +14,14 @@ class EstimatorName(object):
     operators: a tuple of strings.
         The names of the several single-site operators that compose the
         correlator.
+    operator_id: an int.
+        The id of the estimator name in the shared `operator_table`.
     """
     def __init__(self, operators):
         super(EstimatorName, self).__init__()
         self.operators = operators
+        self.operator_id = operator_table.operator_id(tuple_to_key(operators,
+                                                                   '*'))
 
 def adapt_estimator_name(estimator_name):
     '''Adapts the estimator name to the database format.
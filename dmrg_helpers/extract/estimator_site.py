@@ -12,7 +12,7 @@ class EstimatorSite(object):
 
     Parameters
     ----------
-    sites: a tuple of strings.
+    sites: a tuple of ints (or strings).
         The sites where the several single-site operators that compose the
         correlator act.
     """
@@ -1,14 +1,17 @@
 ''' Functions to extract data and create databases.
 '''
 from dmrg_helpers.extract.database import Database
+from dmrg_helpers.extract.parallel_ingest import insert_files_in_parallel
 from dmrg_helpers.extract.locate_estimator_files import locate_estimator_files
 from dmrg_helpers.core.dmrg_logging import logger 
 
-def create_db_from_file(filename, database_name=":memory:"):
+def create_db_from_file(filename, database_name=":memory:", estimators=None,
+                        parse_cache=None, append=False):
     """Creates a database with the data extracted for a file.
 
-    The file must be an estimators.dat-type file. A new database is created.
-    The database is created in memory if no database_name is provided.
+    The file must be an estimators.dat-type file. A new database is created,
+    unless you `append` to an existing one. The database is created in memory
+    if no database_name is provided.
 
     Parameters
     ----------
@@ -17,22 +20,30 @@ def create_db_from_file(filename, database_name=":memory:"):
         relative or absolute.
     database_name: a string (defaulted to ":memory:").
         The name of the file to which the database will be saved.
+    estimators: a list of strings (defaulted to None).
+        If not None, only the data for these estimators, e.g. 's_z*s_z', are
+        inserted in the database.
+    parse_cache: a ParseCache (defaulted to None).
+        If not None, the cache used to avoid parsing unchanged files.
+    append: a bool (defaulted to False).
+        Whether to add the data to the database in `database_name`, if it
+        exists already. If the file is already in it and has not changed, it
+        is not read again.
 
     Returns
     -------
     A Database object.
     """
-    db = Database(database_name)
-    db.insert_data_from_file(filename)
-    logger.info('File {0} inserted in database {1}'.format(filename,
-                                                           database_name))
-    return db
+    return create_db_from_files([filename], database_name, estimators,
+                                parse_cache, append)
 
-def create_db_from_files(files, database_name=":memory:"): 
+def create_db_from_files(files, database_name=":memory:", estimators=None,
+                         parse_cache=None, append=False): 
     """Creates a database with the data extracted for a list fo files.
 
-    The file must be an estimators.dat-type file. A new database is created.
-    The database is created in memory if no database_name is provided.
+    The file must be an estimators.dat-type file. A new database is created,
+    unless you `append` to an existing one. The database is created in memory
+    if no database_name is provided.
 
     Parameters
     ----------
@@ -41,24 +52,101 @@ def create_db_from_files(files, database_name=":memory:"):
         relative or absolute.
     database_name: a string (defaulted to ":memory:").
         The name of the file to which the database will be saved.
+    estimators: a list of strings (defaulted to None).
+        If not None, only the data for these estimators, e.g. 's_z*s_z', are
+        inserted in the database.
+    parse_cache: a ParseCache (defaulted to None).
+        If not None, the cache used to avoid parsing unchanged files.
+    append: a bool (defaulted to False).
+        Whether to add the data to the database in `database_name`, if it
+        exists already. Files already in it that have not changed are not
+        read again, and the data of the files that changed are replaced.
 
     Returns
     -------
     A Database object.
     """
-    db = Database(database_name)
-    for filename in files:
-        db.insert_data_from_file(filename)
+    db, files = open_db_for_files(files, database_name, estimators, append)
+    with db.bulk_load(drop_indexes=len(files) >= db.number_of_runs()):
+        for filename in files:
+            db.insert_data_from_file(filename, estimators, parse_cache)
+            logger.info('File {0} inserted in database {1}'.format(
+                filename, database_name))
     return db
 
+def create_db_from_files_in_parallel(files, database_name=":memory:",
+                                     estimators=None, parse_cache=None,
+                                     append=False, processes=None,
+                                     batch_size=100000, queue_size=8):
+    """Creates a database with the data extracted for a list of files.
+
+    Does the same as `create_db_from_files`, but the files are parsed in a
+    pool of processes, while the calling process inserts the data in the
+    database. See `parallel_ingest.insert_files_in_parallel`.
+
+    Parameters
+    ----------
+    filename: a list of strings.
+        The filenames of the estimators.dat files to be read. The path can be
+        relative or absolute.
+    database_name: a string (defaulted to ":memory:").
+        The name of the file to which the database will be saved.
+    estimators: a list of strings (defaulted to None).
+        If not None, only the data for these estimators, e.g. 's_z*s_z', are
+        inserted in the database.
+    parse_cache: a ParseCache (defaulted to None).
+        If not None, the cache used to avoid parsing unchanged files.
+    append: a bool (defaulted to False).
+        Whether to add the data to the database in `database_name`, if it
+        exists already. Files already in it that have not changed are not
+        read again, and the data of the files that changed are replaced.
+    processes: an int (defaulted to None).
+        The number of processes parsing files. If None, the number of cores.
+    batch_size: an int (defaulted to 100000).
+        The number of rows the processes send at once to be inserted.
+    queue_size: an int (defaulted to 8).
+        The number of batches of rows waiting to be inserted at most.
+
+    Returns
+    -------
+    A Database object.
+    """
+    db, files = open_db_for_files(files, database_name, estimators, append)
+    with db.bulk_load(drop_indexes=len(files) >= db.number_of_runs()):
+        insert_files_in_parallel(db, files, estimators, parse_cache, 
+                                 processes, batch_size, queue_size)
+    return db
+
+def open_db_for_files(files, database_name, estimators, append):
+    """Opens a database and finds the files that have to be inserted.
+
+    When you `append`, the files that are already in the database and have
+    not changed are left out, and the data of those that changed are removed
+    from the database.
+
+    Returns
+    -------
+    db: a Database object.
+    files: a list of strings with the files to insert.
+    """
+    db = Database(database_name, append)
+    if append:
+        files = [f for f in files if not db.is_up_to_date(f, estimators)]
+        # the old data are removed while the indexes are still there
+        for filename in files:
+            db.remove_file(filename)
+    return db, files
+
 def create_db_from_dir(root_dir, database_name=":memory:", 
-                       pattern='estimators.dat'):
+                       pattern='estimators.dat', estimators=None, 
+                       parse_cache=None, append=False, processes=1):
     """Creates a database with the data extracted by crawling a dir.
 
     The function crawls down a dir a picks up all the files whose name follows
-    the `pattern`.  The files must be estimators.dat-type files. A new
-    database is created.  The database is created in memory if no database_name
-    is provided.
+    the `pattern`, including their compressed versions, like 
+    'estimators.dat.gz'. The files must be estimators.dat-type files. A new
+    database is created, unless you `append` to an existing one. The database
+    is created in memory if no database_name is provided.
 
     Parameters
     ----------
@@ -67,11 +155,29 @@ def create_db_from_dir(root_dir, database_name=":memory:",
         relative or absolute.
     database_name: a string (defaulted to ":memory:").
         The name of the file to which the database will be saved.
+    estimators: a list of strings (defaulted to None).
+        If not None, only the data for these estimators, e.g. 's_z*s_z', are
+        inserted in the database.
+    parse_cache: a ParseCache (defaulted to None).
+        If not None, the cache used to avoid parsing unchanged files.
+    append: a bool (defaulted to False).
+        Whether to add the data to the database in `database_name`, if it
+        exists already. Only the files that are new or changed since they
+        were inserted are read.
+    processes: an int (defaulted to 1).
+        The number of processes parsing files. If None, the number of cores.
+        With more than one, `create_db_from_files_in_parallel` is used.
 
     Returns
     -------
     A Database object.
     """
     files_found = locate_estimator_files(root_dir, pattern)
-    db = create_db_from_files(files_found, database_name)
+    if processes == 1:
+        db = create_db_from_files(files_found, database_name, estimators, 
+                                  parse_cache, append)
+    else:
+        db = create_db_from_files_in_parallel(files_found, database_name, 
+                                              estimators, parse_cache, append,
+                                              processes)
     return db
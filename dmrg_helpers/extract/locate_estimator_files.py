@@ -3,12 +3,20 @@
 import os
 import fnmatch
 from dmrg_helpers.core.dmrg_logging import logger 
+from dmrg_helpers.extract.open_estimator_file import compressed_extensions
 
-def locate_estimator_files(root, pattern='estimators*.dat'):
+def locate_estimator_files(root, pattern='estimators*.dat', compressed=True):
     '''Locates all the files named by the pattern in the root directory.
 
     You use this function to crawl a directory tree looking for estimators
-    files. An estimator file is a file whose name is matched by `pattern`.
+    files. An estimator file is a file whose name is matched by `pattern`, or,
+    if `compressed` is True, by `pattern` followed by the extension of a
+    compressed file, like 'estimators.dat.gz'.
+
+    If a directory has the same file both uncompressed and compressed, e.g.
+    while it is being archived, only one of them is returned, so its data are
+    not inserted twice: the uncompressed one, or else the first of the
+    compressed ones in `compressed_extensions`.
 
     Parameters
     ----------
@@ -17,16 +25,58 @@ def locate_estimator_files(root, pattern='estimators*.dat'):
         absolute and must exist
     pattern: a string
         The pattern you want to match filenames with.
+    compressed: a bool (defaulted to True)
+        Whether to match also compressed files with gzip, bz2, or xz.
 
     Returns
     -------
     files_found a list of strings.
         The absolute paths for all the files found in a list.
     '''
+    patterns = [pattern]
+    if compressed:
+        patterns += [pattern + extension for extension in compressed_extensions]
     files_found = []
     logger.info('Searching for {0} files in {1}'.format(pattern, root))
     for path, dirs, files in os.walk(os.path.abspath(root)):
-        for filename in fnmatch.filter(files, pattern):
-            files_found.append(os.path.join(path, filename))
-            logger.info('Found file {0}'.format(files_found[-1]))
+        matched = [f for f in files 
+                   if any(fnmatch.fnmatch(f, p) for p in patterns)]
+        chosen = {}
+        for filename in matched:
+            base, preference = uncompressed_name(filename, pattern)
+            if base not in chosen or preference < chosen[base][1]:
+                chosen[base] = (filename, preference)
+        for filename in matched:
+            kept = chosen[uncompressed_name(filename, pattern)[0]][0]
+            if filename == kept:
+                files_found.append(os.path.join(path, filename))
+                logger.info('Found file {0}'.format(files_found[-1]))
+            else:
+                logger.info('Skipping file {0}, the same as {1}'.format(
+                    os.path.join(path, filename), kept))
     return files_found
+
+def uncompressed_name(filename, pattern):
+    '''Gets the name of a file without the extension of its compression.
+
+    Parameters
+    ----------
+    filename: a string.
+        The name of a file matched by `pattern`, maybe with the extension of
+        a compressed file.
+    pattern: a string.
+        The pattern the uncompressed names are matched with.
+
+    Returns
+    -------
+    name: a string.
+        The name without the extension, e.g. 'estimators.dat' for
+        'estimators.dat.gz'.
+    preference: an int.
+        0 if the file is not compressed, otherwise one plus the index of its
+        extension in `compressed_extensions`.
+    '''
+    name, extension = os.path.splitext(filename)
+    if extension in compressed_extensions and fnmatch.fnmatch(name, pattern):
+        return name, compressed_extensions.index(extension) + 1
+    return filename, 0
@@ -0,0 +1,75 @@
+'''A function to open estimators files, compressed or not.
+'''
+import bz2
+import gzip
+import io
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# The first bytes of the files for each compression format.
+magic_numbers = {'gzip': '\x1f\x8b', 'bz2': 'BZh', 'xz': '\xfd7zXZ\x00'}
+
+# The extensions the compressed estimators files can have.
+compressed_extensions = ['.gz', '.bz2', '.xz']
+
+def detect_compression(filename):
+    '''Detects whether a file is compressed by looking at its first bytes.
+
+    Parameters
+    ----------
+    filename: a string.
+        The file you want to check. It must exist.
+
+    Returns
+    -------
+    a string with the compression format ('gzip', 'bz2', or 'xz'), or None if
+    the file is not compressed.
+    '''
+    with open(filename, 'rb') as f:
+        head = f.read(max(len(m) for m in magic_numbers.itervalues()))
+    for compression, magic in magic_numbers.iteritems():
+        if head.startswith(magic):
+            return compression
+    return None
+
+def open_estimator_file(filename):
+    '''Opens an estimators file for reading.
+
+    Files compressed with gzip, bz2, or xz are detected from their first bytes,
+    not their extension, and decompressed on the fly while you read them, so
+    there is no need to decompress them to a temporary file.
+
+    Parameters
+    ----------
+    filename: a string.
+        The file you want to read. It must exist.
+
+    Returns
+    -------
+    a file object that can be used in a `with` statement, and iterated line
+    by line or read at once.
+
+    Raises
+    ------
+    DMRGException: if the file is compressed with xz and the lzma module is
+    not available (in Python 2 you get it installing backports.lzma).
+    '''
+    # The file objects for gzip and xz are buffered, otherwise iterating them
+    # line by line is several times slower than reading plain text.
+    compression = detect_compression(filename)
+    if compression == 'gzip':
+        return io.BufferedReader(gzip.open(filename, 'rb'))
+    elif compression == 'bz2':
+        return bz2.BZ2File(filename, 'r')
+    elif compression == 'xz':
+        if lzma is None:
+            raise DMRGException('Cannot read xz files: no lzma module')
+        return io.BufferedReader(lzma.LZMAFile(filename, 'r'))
+    else:
+        return open(filename, 'r')
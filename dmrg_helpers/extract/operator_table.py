@@ -0,0 +1,157 @@
+'''A symbol table to intern operator names and cache their parsing.
+'''
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.tuple_to_key import tuple_to_key
+
+class OperatorTable(object):
+    """A table that gives a small integer id to each operator name.
+
+    The same operator strings, such as `s_z_12`, show up many times in an
+    estimators file. You use this class to split each of them only once: the
+    results of splitting a single-site operator into name and site are kept
+    in a cache, so the next time you split it you only pay a dictionary
+    lookup. The cache is bounded: when it is full it is emptied.
+
+    Operator names, both for single-site operators, like `s_z`, and for
+    estimators, like `s_z*s_z`, get an integer id the first time they are
+    seen. Sites are converted to ints.
+
+    Parameters
+    ----------
+    max_cache_size: an int (defaulted to 65536).
+        The maximum number of single-site operators kept in the cache.
+
+    Attributes
+    ----------
+    names: a list of strings.
+        The operator names. The id of an operator is its index in this list.
+    ids: a dict of strings on ints.
+        The id of each operator name.
+    hits: an int.
+        The number of times a split was found in the cache.
+    misses: an int.
+        The number of times a split was not found in the cache.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.operator_table import OperatorTable
+    >>> table = OperatorTable()
+    >>> table.process('s_z_1*s_z_2')
+    (1, (1, 2))
+    >>> table.process('s_z_1*s_z_3')
+    (1, (1, 3))
+    >>> table.names
+    ['s_z', 's_z*s_z']
+    >>> table.hits, table.misses
+    (1, 3)
+    """
+    def __init__(self, max_cache_size=65536):
+        super(OperatorTable, self).__init__()
+        self.max_cache_size = max_cache_size
+        self.names = []
+        self.ids = {}
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Returns the number of operator names in the table.
+        """
+        return len(self.names)
+
+    def operator_id(self, name):
+        """Returns the id for an operator name, adding it if it is new.
+
+        Parameters
+        ----------
+        name: a string.
+            The name of an operator without sites, e.g. 's_z' or 's_z*s_z'.
+
+        Returns
+        -------
+        an int with the id.
+        """
+        try:
+            return self.ids[name]
+        except KeyError:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            return self.ids[name]
+
+    def operator_name(self, operator_id):
+        """Returns the operator name for an id.
+        """
+        return self.names[operator_id]
+
+    def split(self, operator):
+        """Splits a single-site operator into the id of its name and its site.
+
+        Parameters
+        ----------
+        operator: a string.
+            The name of a single site operator, e.g. 's_z_12'.
+
+        Returns
+        -------
+        operator_id: an int.
+            The id of the name of the single-site operator, e.g. 's_z'.
+        site: an int.
+            The site where this operator acts.
+
+        Raises
+        ------
+        DMRGException: if the operator has no site, or it is not an integer.
+        """
+        try:
+            result = self.cache[operator]
+            self.hits += 1
+            return result
+        except KeyError:
+            self.misses += 1
+
+        # the same split as `split_into_name_and_site`, whose module imports
+        # this one
+        name, separator, site = operator.rpartition('_')
+        if not separator:
+            raise DMRGException('Bad operator name')
+        try:
+            result = (self.operator_id(name), int(site))
+        except ValueError:
+            raise DMRGException('Bad operator name')
+
+        if len(self.cache) >= self.max_cache_size:
+            self.cache.clear()
+        self.cache[operator] = result
+        return result
+
+    def process(self, estimator_name):
+        """Splits the name of an estimator into the id of its name and sites.
+
+        `process_estimator_name` goes through this function, so the
+        single-site operators are split only once for all the files.
+
+        Parameters
+        ----------
+        estimator_name: a string.
+            One of the names of the first column of the estimators file,
+            e.g. 's_z_12*s_z_13'.
+
+        Returns
+        -------
+        operator_id: an int.
+            The id of the name of the estimator without sites, e.g. 's_z*s_z'.
+        sites: a n-tuple of ints.
+            The sites at which each of the operators act.
+        """
+        ids, sites = zip(*map(self.split, estimator_name.split('*')))
+        name = tuple_to_key([self.names[i] for i in ids], '*')
+        return self.operator_id(name), sites
+
+    def hit_rate(self):
+        """Returns the fraction of the splits found in the cache.
+        """
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+# The table shared by the readers, the estimator names and the databases.
+operator_table = OperatorTable()
@@ -0,0 +1,201 @@
+#
+# File: parallel_ingest.py
+# Author: Ivan Gonzalez
+#
+""" A module to insert many estimators files in a database using processes.
+"""
+import os
+import Queue
+import multiprocessing
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.core.dmrg_logging import logger
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.database import adapt_meta_data, hash_file
+from dmrg_helpers.extract.operator_table import operator_table
+
+# The queue where the workers put their batches, set by `init_worker`.
+worker_queue = None
+
+# The seconds the writer waits for a message before checking that the
+# workers are still alive.
+poll_interval = 1.0
+
+def init_worker(queue, started):
+    """Initializes a process of the pool with the queue for the batches.
+
+    Queues cannot be passed as arguments of the tasks of a pool, so each
+    process gets it when it starts. The process also counts itself in
+    `started`, a shared int: the pool starts a new process only when one
+    dies, so the writer knows a process died when there are more than the
+    size of the pool.
+    """
+    global worker_queue
+    worker_queue = queue
+    with started.get_lock():
+        started.value += 1
+
+def parse_file(task):
+    """Parses a file and puts its data in the queue in batches of rows.
+
+    You use this function in the processes of the pool. The messages put in
+    the queue are tuples whose first element says what they are:
+
+    - ('start', filename, meta_keys, meta_vals, operators, stat, hash): the
+      file has been parsed; `operators` are the names of the estimators
+      found, and `stat` the size and modification time of the file.
+    - ('rows', filename, codes, sites, values): a batch of rows. The codes
+      are indexes in `operators`.
+    - ('done', filename): all the rows of the file have been put.
+    - ('error', filename, message): the file could not be parsed. No rows
+      of the file have been put.
+
+    Parameters
+    ----------
+    task: a 4-tuple.
+        The filename, the estimators to keep (None to keep all), the
+        ParseCache (or None), and the number of rows in each batch.
+    """
+    filename, estimators, parse_cache, batch_size = task
+    filename = os.path.abspath(filename)
+    try:
+        reader = ColumnarFileReader(estimators, parse_cache)
+        reader.read(filename)
+        meta_keys, meta_vals = adapt_meta_data(reader)
+        stat = os.stat(filename)
+        file_hash = hash_file(filename)
+    except Exception as e:
+        worker_queue.put(('error', filename, str(e)))
+        return
+
+    local_codes = np.zeros(len(operator_table), dtype=np.int32)
+    for i, o in enumerate(reader.operators):
+        local_codes[operator_table.ids[o]] = i
+    codes = local_codes[reader.codes]
+
+    worker_queue.put(('start', filename, meta_keys, meta_vals,
+                      reader.operators, (stat.st_size, stat.st_mtime),
+                      file_hash))
+    for start in xrange(0, len(reader), batch_size):
+        end = start + batch_size
+        worker_queue.put(('rows', filename, codes[start:end],
+                          np.ascontiguousarray(reader.sites[start:end]),
+                          reader.values[start:end]))
+    worker_queue.put(('done', filename))
+
+def insert_files_in_parallel(db, files, estimators=None, parse_cache=None,
+                             processes=None, batch_size=100000, queue_size=8):
+    """Inserts files in a database, parsing them in a pool of processes.
+
+    The files are parsed in the processes of a pool, which put the rows in
+    batches in a queue. The calling process is the only one writing to the
+    database: it takes the batches out of the queue and inserts them as they
+    come. The queue holds at most `queue_size` batches, so when the database
+    cannot keep up, the processes wait instead of piling up data in memory.
+
+    Parameters
+    ----------
+    db: a Database.
+        The database where the data are inserted.
+    files: a list of strings.
+        The filenames of the estimators.dat files to be read.
+    estimators: a list of strings (defaulted to None).
+        If not None, only the data for these estimators, e.g. 's_z*s_z', are
+        inserted.
+    parse_cache: a ParseCache (defaulted to None).
+        If not None, the cache used to avoid parsing unchanged files.
+    processes: an int (defaulted to None).
+        The number of processes in the pool. If None, the number of cores.
+    batch_size: an int (defaulted to 100000).
+        The number of rows in each batch.
+    queue_size: an int (defaulted to 8).
+        The number of batches the queue can hold.
+
+    Raises
+    ------
+    DMRGException: if a file cannot be read, its meta_keys are not the
+    ones in the database, or a process of the pool dies, e.g. killed when
+    out of memory. The files completely inserted before are kept, the rows
+    of the rest are removed.
+    """
+    if not files:
+        return
+    processes = min(processes or multiprocessing.cpu_count(), len(files))
+    queue = multiprocessing.Queue(queue_size)
+    started = multiprocessing.Value('i', 0)
+    pool = multiprocessing.Pool(processes, init_worker, (queue, started))
+    tasks = [(f, estimators, parse_cache, batch_size) for f in files]
+    result = pool.map_async(parse_file, tasks)
+    pool.close()
+
+    runs = {}
+    remaining = len(files)
+    try:
+        while remaining:
+            was_ready = result.ready()
+            try:
+                message = queue.get(timeout=poll_interval)
+            except Queue.Empty:
+                check_workers(result, was_ready, started.value > processes)
+                continue
+            kind, filename = message[:2]
+            if kind == 'error':
+                raise DMRGException('Cannot read {0}: {1}'.format(
+                    filename, message[2]))
+            elif kind == 'start':
+                meta_keys, meta_vals, operators, stat, file_hash = message[2:]
+                with db.conn:
+                    run_id = db.insert_run(filename, meta_keys, meta_vals)
+                    operator_ids = db.insert_operators(operators)
+                runs[filename] = (run_id, operator_ids, stat, file_hash)
+            elif kind == 'rows':
+                codes, sites, values = message[2:]
+                run_id, operator_ids = runs[filename][:2]
+                with db.conn:
+                    db.insert_rows(run_id, operator_ids[codes], sites, values)
+            else:
+                run_id, _, (size, mtime), file_hash = runs.pop(filename)
+                db.insert_in_manifest(filename, size, mtime, file_hash,
+                                      estimators, run_id)
+                remaining -= 1
+                logger.info('File {0} inserted in database {1}'.format(
+                    filename, db.filename))
+    except:
+        pool.terminate()
+        for run_id, _, _, _ in runs.itervalues():
+            db.remove_run(run_id)
+        raise
+    finally:
+        pool.join()
+
+def check_workers(result, was_ready, died):
+    """Checks that the files not done yet will be done some day.
+
+    You use this function when no message came from the workers for a
+    while. The pool starts a new process when one dies, e.g. killed when
+    out of memory, but the task of the dead one is lost, and the result of
+    the pool is never ready.
+
+    Parameters
+    ----------
+    result: the AsyncResult of the tasks of the pool.
+    was_ready: a bool.
+        Whether the result was ready before waiting for messages. If so,
+        all the messages of the workers had time to arrive.
+    died: a bool.
+        Whether a process of the pool died.
+
+    Raises
+    ------
+    DMRGException: if a task failed, all the tasks returned but some file
+    is not done, or a process of the pool died.
+    """
+    if result.ready() and not result.successful():
+        try:
+            result.get()
+        except Exception as e:
+            raise DMRGException('A process failed: {0}'.format(e))
+    if was_ready:
+        raise DMRGException('Some files were not parsed')
+    if died:
+        raise DMRGException('A process of the pool died')
@@ -0,0 +1,177 @@
+#
+# File: parallel_reader.py
+# Author: Ivan Gonzalez
+#
+""" A module to read a single huge estimators file using several processes.
+"""
+import os
+import multiprocessing
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.core.dmrg_logging import logger
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.open_estimator_file import detect_compression
+from dmrg_helpers.extract.operator_table import operator_table
+
+class ParallelFileReader(ColumnarFileReader):
+    """A file reader that parses chunks of a file in a pool of processes.
+
+    The file is split in chunks of about `chunk_size` bytes that start and
+    end at a newline. Each chunk is parsed as ColumnarFileReader does in one
+    of the processes of a pool, and the results are put back together in the
+    order of the file. The comments, and therefore the metadata, are collected
+    from every chunk.
+
+    Compressed files cannot be split without decompressing them first, so
+    they are read in a single process.
+
+    Parameters
+    ----------
+    processes: an int (defaulted to None).
+        The number of processes in the pool. If None, the number of cores.
+    chunk_size: an int (defaulted to 32 MB).
+        The approximate size in bytes of each chunk.
+    estimators: a list of strings (defaulted to None).
+        If not None, only the rows for these estimators, e.g. 's_z*s_z', are
+        kept.
+    """
+    def __init__(self, processes=None, chunk_size=32*1024*1024, 
+                 estimators=None):
+        super(ParallelFileReader, self).__init__(estimators)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+
+    def read(self, filename):
+        """Reads a file and extracts the data.
+
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators file. The file must exist. If you
+            pass a relative path it will be made absolute.
+
+        Raises
+        ------
+        DMRGException: if the file does not exist or it is not properly
+        formatted.
+        """
+        if not os.path.exists(filename):
+            raise DMRGException('File does not exist')
+        if detect_compression(filename) is not None:
+            super(ParallelFileReader, self).read(filename)
+            return
+
+        self.filename = os.path.abspath(filename)
+        chunks = [chunk + (self.estimators,) for chunk in 
+                  split_in_chunks(self.filename, self.chunk_size)]
+        if len(chunks) == 1 or self.processes == 1:
+            parsed = map(parse_chunk, chunks)
+        else:
+            pool = multiprocessing.Pool(min(self.processes, len(chunks)))
+            try:
+                parsed = pool.map(parse_chunk, chunks)
+            finally:
+                pool.close()
+                pool.join()
+        self.merge(parsed)
+
+        logger.info('File {0} has been read in {1} chunks'.format(
+            self.filename, len(chunks)))
+
+    def merge(self, parsed):
+        """Puts together the results of parsing each chunk.
+
+        Parameters
+        ----------
+        parsed: a list of tuples.
+            The results of `parse_chunk` for each chunk, in the order of the
+            file.
+        """
+        codes, sites, values = [], [], []
+        for comments, operators, local_codes, s, v in parsed:
+            for comment in comments:
+                self.comments.append(comment)
+                self.extract_meta_from_comment(comment)
+            ids = np.array([operator_table.operator_id(o) for o in operators],
+                           dtype=np.int32)
+            for o in operators:
+                if o not in self.operators:
+                    self.operators.append(o)
+            codes.append(ids[local_codes])
+            sites.append(s)
+            values.append(v)
+
+        if not values:
+            return
+        width = max(s.shape[1] for s in sites)
+        self.codes = np.concatenate(codes)
+        self.sites = np.concatenate([pad_sites(s, width) for s in sites])
+        self.values = np.concatenate(values)
+
+def split_in_chunks(filename, chunk_size):
+    """Splits a file in byte ranges that start and end at a newline.
+
+    Parameters
+    ----------
+    filename: a string.
+        The file to split.
+    chunk_size: an int.
+        The approximate size in bytes of each chunk.
+
+    Returns
+    -------
+    a list of 3-tuples with the filename and the first and last (excluded)
+    bytes of each chunk.
+    """
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        while boundaries[-1] + chunk_size < size:
+            f.seek(boundaries[-1] + chunk_size)
+            f.readline()
+            boundaries.append(f.tell())
+    if boundaries[-1] < size or size == 0:
+        boundaries.append(size)
+    return [(filename, start, end)
+            for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+def parse_chunk(chunk):
+    """Parses a chunk of a file.
+
+    You use this function in the processes of the pool, so the operator codes
+    are returned as indexes in the list of operators found in the chunk,
+    instead of ids in the `operator_table` of the process.
+
+    Parameters
+    ----------
+    chunk: a 4-tuple.
+        The filename, the first and last (excluded) bytes of the chunk, and
+        the estimators to keep (None to keep all).
+
+    Returns
+    -------
+    a 5-tuple with the comments, the operators, the codes, the sites and the
+    values found in the chunk.
+    """
+    filename, start, end, estimators = chunk
+    with open(filename, 'r') as f:
+        f.seek(start)
+        text = f.read(end - start)
+    reader = ColumnarFileReader(estimators)
+    reader.parse(text)
+
+    local_codes = np.zeros(len(operator_table), dtype=np.int32)
+    for i, o in enumerate(reader.operators):
+        local_codes[operator_table.ids[o]] = i
+    return (reader.comments, reader.operators, local_codes[reader.codes],
+            reader.sites, reader.values)
+
+def pad_sites(sites, width):
+    """Pads with -1 a matrix of sites up to `width` columns.
+    """
+    if sites.shape[1] == width:
+        return sites
+    padded = np.empty((len(sites), width), dtype=sites.dtype)
+    padded.fill(-1)
+    padded[:, :sites.shape[1]] = sites
+    return padded
@@ -0,0 +1,243 @@
+'''A cache to keep the result of parsing estimators files in binary files.
+'''
+import os
+import json
+import struct
+import hashlib
+import tempfile
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.core.dmrg_logging import logger
+from dmrg_helpers.extract.operator_table import operator_table
+from dmrg_helpers.extract.reader import FileReader
+
+class ParseCache(object):
+    """A cache of parsed estimators files stored in binary sidecar files.
+
+    Parsing the text of an estimators file is the slow part of reading it. You
+    use this class to store the columns produced by a ColumnarFileReader in a
+    binary file, the sidecar, so the next time you read the same file you load
+    the columns instead, memory-mapped.
+
+    The sidecar is stored next to the estimators file, as a hidden file with
+    the same name and a '.cache' extension, or in a cache directory if you
+    give one. Each sidecar records the path, size and modification time of
+    the file it was created from, and the version of the format. If any of
+    these does not match, or the sidecar is corrupt, the sidecar is ignored
+    and built again the next time the file is parsed.
+
+    The sidecar has an 8-byte magic string, the length of the header as an
+    8-byte int, the header in JSON, and the arrays for the codes, sites and
+    values, each one aligned to 16 bytes.
+
+    Parameters
+    ----------
+    cache_dir: a string (defaulted to None).
+        The directory where the sidecars are stored. If None, each sidecar
+        is stored in the same directory as its estimators file.
+    """
+    magic = 'DMRGPCAC'
+    version = 1
+    alignment = 16
+
+    def __init__(self, cache_dir=None):
+        super(ParseCache, self).__init__()
+        self.cache_dir = cache_dir
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def sidecar_name(self, filename):
+        """Returns the name of the sidecar for an estimators file.
+
+        Parameters
+        ----------
+        filename: a string.
+            The absolute path of the estimators file.
+        """
+        if self.cache_dir is None:
+            dirname, basename = os.path.split(filename)
+            return os.path.join(dirname, '.' + basename + '.cache')
+        digest = hashlib.sha1(filename).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.cache')
+
+    def load(self, reader, filename):
+        """Loads the sidecar of a file into a reader.
+
+        Parameters
+        ----------
+        reader: a ColumnarFileReader.
+            The reader whose columns, comments and metadata are set.
+        filename: a string.
+            The absolute path of the estimators file.
+
+        Returns
+        -------
+        a bool: whether the sidecar was found and is valid.
+        """
+        sidecar = self.sidecar_name(filename)
+        if not os.path.exists(sidecar):
+            logger.info('Cache miss for {0}'.format(filename))
+            return False
+        try:
+            header, offset = read_header(sidecar, self.magic)
+            if not self.is_fresh(header, filename):
+                logger.info('Stale cache for {0}'.format(filename))
+                return False
+            arrays = {}
+            for key, (dtype, shape, start) in header['arrays'].iteritems():
+                arrays[key] = map_array(sidecar, dtype, shape, offset + start)
+            # nothing is set in the reader until the whole sidecar is checked
+            to_str = lambda s: s.encode('utf-8')
+            operators = map(to_str, header['operators'])
+            scratch = FileReader()
+            for comment in map(to_str, header['comments']):
+                scratch.comments.append(comment)
+                scratch.extract_meta_from_comment(comment)
+            codes, sites, values = check_arrays(arrays, len(operators))
+            ids = np.array([operator_table.operator_id(o) for o in operators],
+                           dtype=np.int32)
+            codes = ids[codes]
+        except (IOError, ValueError, KeyError, TypeError, IndexError,
+                AttributeError, DMRGException, struct.error):
+            logger.info('Corrupt cache for {0}'.format(filename))
+            return False
+
+        reader.comments.extend(scratch.comments)
+        reader.meta.update(scratch.meta)
+        reader.operators = operators
+        reader.codes = codes
+        reader.sites = sites
+        reader.values = values
+        logger.info('Cache hit for {0}'.format(filename))
+        return True
+
+    def store(self, reader, filename):
+        """Stores the columns of a reader in the sidecar of a file.
+
+        If the sidecar cannot be written, e.g. you have no permissions in the
+        directory, a message is logged and nothing else happens.
+
+        Parameters
+        ----------
+        reader: a ColumnarFileReader.
+            A reader that has read the whole file.
+        filename: a string.
+            The absolute path of the estimators file.
+        """
+        local_codes = np.zeros(len(operator_table), dtype=np.int32)
+        for i, o in enumerate(reader.operators):
+            local_codes[operator_table.ids[o]] = i
+        arrays = [('codes', local_codes[reader.codes]),
+                  ('sites', np.ascontiguousarray(reader.sites)),
+                  ('values', np.ascontiguousarray(reader.values))]
+
+        stat = os.stat(filename)
+        header = {'version': self.version, 'path': filename,
+                  'size': stat.st_size, 'mtime': stat.st_mtime,
+                  'operators': reader.operators, 'comments': reader.comments,
+                  'arrays': {}}
+        start = 0
+        for key, array in arrays:
+            header['arrays'][key] = (array.dtype.str, array.shape, start)
+            start += aligned(array.nbytes, self.alignment)
+
+        sidecar = self.sidecar_name(filename)
+        try:
+            encoded = json.dumps(header)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(sidecar))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.magic)
+                f.write(struct.pack('<Q', len(encoded)))
+                f.write(encoded)
+                f.write('\0' * (aligned(f.tell(), self.alignment) - f.tell()))
+                for key, array in arrays:
+                    f.write(array.tostring())
+                    f.write('\0' * (aligned(array.nbytes, self.alignment) -
+                                    array.nbytes))
+            os.chmod(tmp, stat.st_mode & 0666)
+            os.rename(tmp, sidecar)
+        except (IOError, OSError, UnicodeDecodeError):
+            logger.info('Cannot write cache for {0}'.format(filename))
+            return
+        logger.info('Cache for {0} written to {1}'.format(filename, sidecar))
+
+    def is_fresh(self, header, filename):
+        """Checks whether a sidecar header matches the current file.
+        """
+        stat = os.stat(filename)
+        return (header['version'] == self.version and
+                header['path'] == filename and
+                header['size'] == stat.st_size and
+                header['mtime'] == stat.st_mtime)
+
+def aligned(n, alignment):
+    """Rounds up `n` to a multiple of `alignment`.
+    """
+    return -(-n // alignment) * alignment
+
+def read_header(sidecar, magic):
+    """Reads the header of a sidecar file.
+
+    Returns
+    -------
+    header: a dict.
+        The header of the sidecar.
+    offset: an int.
+        The position in the file where the arrays start.
+
+    Raises
+    ------
+    ValueError: if the sidecar does not start with `magic` or the header is
+    not valid JSON.
+    """
+    with open(sidecar, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError('Bad magic')
+        length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length))
+        offset = aligned(f.tell(), ParseCache.alignment)
+    return header, offset
+
+def check_arrays(arrays, n_operators):
+    """Checks that the arrays of a sidecar fit together.
+
+    Parameters
+    ----------
+    arrays: a dict of strings on numpy arrays.
+        The codes, sites and values read from the sidecar.
+    n_operators: an int.
+        The number of operators in the header of the sidecar.
+
+    Returns
+    -------
+    the codes, sites and values.
+
+    Raises
+    ------
+    ValueError: if the shapes of the arrays do not match, or a code is not
+    the index of an operator.
+    """
+    codes, sites, values = arrays['codes'], arrays['sites'], arrays['values']
+    n_rows = len(codes)
+    if (codes.ndim != 1 or sites.ndim != 2 or sites.shape[0] != n_rows or
+        values.shape != (n_rows,)):
+        raise ValueError('Bad shapes in cache')
+    if n_rows and (codes.min() < 0 or codes.max() >= n_operators):
+        raise ValueError('Bad codes in cache')
+    return codes, sites, values
+
+def map_array(sidecar, dtype, shape, offset):
+    """Memory-maps an array stored in a sidecar file.
+
+    Raises
+    ------
+    ValueError: if the sidecar is too short to hold the array.
+    """
+    dtype = np.dtype(str(dtype))
+    shape = tuple(shape)
+    if os.path.getsize(sidecar) < offset + dtype.itemsize * np.prod(shape):
+        raise ValueError('Truncated cache')
+    if 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(sidecar, dtype=dtype, mode='r', offset=offset,
+                     shape=shape)
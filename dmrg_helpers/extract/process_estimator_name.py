@@ -2,6 +2,7 @@
 '''
 
 from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.operator_table import operator_table
 
 def process_estimator_name(estimator_name):
     '''Process the name of the estimator and tries to extract the operators and
@@ -19,16 +20,14 @@ def process_estimator_name(estimator_name):
         The single-site operators that form the estimator.
     sites: a n-tuple of ints.
         The sites at which each of the operators above act.
+
+    Raises
+    ------
+    DMRGException: if an operator has no site, or it is not an integer.
     '''
-    operators = estimator_name.split('*')
-    operator_names = []
-    sites = []
-
-    for operator in operators:
-        name, site = split_into_name_and_site(operator)
-        operator_names.append(name)
-        sites.append(site)
-    return (operator_names, sites)
+    operator_id, sites = operator_table.process(estimator_name)
+    operator_names = operator_table.operator_name(operator_id).split('*')
+    return (operator_names, list(sites))
 
 def split_into_name_and_site(operator):
     """Splits an operator into a single-site operator name and site.
@@ -0,0 +1,221 @@
+'''Functions to build the SQL queries that get estimators from the database.
+'''
+from itertools import izip
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.generate_indexes import SiteFilter
+
+def site_columns(arity):
+    '''Returns the names of the columns for the sites of an estimator.
+
+    Parameters
+    ----------
+    arity: an int.
+        The number of single-site operators of the estimator.
+
+    Returns
+    -------
+    a list of strings.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.query_builder import site_columns
+    >>> site_columns(2)
+    ['site0', 'site1']
+    '''
+    return ['site{0}'.format(i) for i in xrange(arity)]
+
+def meta_column(key):
+    '''Returns the name of the column of the runs table for a meta key.
+
+    The name is quoted, as the keys come from the files.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.query_builder import meta_column
+    >>> print meta_column('numberOfSites')
+    "meta_numberOfSites"
+    '''
+    return '"meta_{0}"'.format(key.replace('"', '""'))
+
+def select_estimator(estimator_name, run_id=None, site_expression=None,
+                     meta=None):
+    '''Builds the query that selects the rows of an estimator.
+
+    This is `select_estimators` for a single estimator.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.query_builder import select_estimator
+    >>> sql, params = select_estimator('n*n')
+    >>> print sql
+    select operator_id, run_id, site0, site1, data from estimators where operator_id in (select id from operators where name in (?))
+    >>> params
+    ('n*n',)
+    '''
+    return select_estimators([estimator_name], run_id, site_expression, meta)
+
+def select_estimators(estimator_names, run_id=None, site_expression=None,
+                      meta=None):
+    '''Builds the query that selects the rows of several estimators.
+
+    The operators are looked up by name in a subquery, so the query is the
+    same whether the operators are in the database or not. The rows come
+    with the id of their operator and run, the sites, as many as the
+    longest of the estimators has, and the value.
+
+    Parameters
+    ----------
+    estimator_names: a list of strings.
+        The operators acting in each site, in order, and separated by '*',
+        for each estimator.
+    run_id: an int (defaulted to None).
+        If not None, only the rows for this run are selected.
+    site_expression: a list of strings (defaulted to None).
+        If not None, only the rows whose sites match these expressions are
+        selected. See `site_predicate`. All the estimators must have as
+        many sites as expressions.
+    meta: a dict (defaulted to None).
+        If not None, only the rows of the runs whose metadata match are
+        selected. See `meta_predicate`.
+
+    Returns
+    -------
+    sql: a string.
+        The query.
+    params: a tuple.
+        The parameters for the placeholders in the query.
+    '''
+    arities = [name.count('*') + 1 for name in estimator_names]
+    columns = site_columns(max(arities))
+    sql = ('select operator_id, run_id, {0}, data from estimators where '
+           'operator_id in (select id from operators where name in ({1}))'
+          ).format(', '.join(columns), ','.join('?' * len(estimator_names)))
+    params = tuple(estimator_names)
+    if run_id is not None:
+        sql += ' and run_id = ?'
+        params += (run_id,)
+    if site_expression is not None:
+        if min(arities) != max(arities):
+            raise DMRGException('Wrong number of site expressions')
+        sql += ' and ' + site_predicate(site_expression, len(columns))
+    if meta:
+        condition, meta_params = meta_predicate(meta)
+        sql += ' and run_id in (select id from runs where {0})'.format(
+            condition)
+        params += meta_params
+    return sql, params
+
+def meta_predicate(meta):
+    '''Compiles conditions on the metadata into a condition on the runs.
+
+    Parameters
+    ----------
+    meta: a dict of strings on values or 2-tuples.
+        For each meta key, e.g. 'numberOfSites', the value it must have, or
+        a tuple with the smallest and largest values it can have. Numbers
+        are compared as numbers.
+
+    Returns
+    -------
+    condition: a string.
+        The condition, in SQL, on the columns of the runs table.
+    params: a tuple.
+        The parameters for the placeholders in the condition.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.query_builder import meta_predicate
+    >>> condition, params = meta_predicate({'Kring': (0.0, 0.5)})
+    >>> print condition
+    "meta_Kring" between ? and ?
+    >>> params
+    (0.0, 0.5)
+    '''
+    conditions = []
+    params = ()
+    for key, value in sorted(meta.iteritems()):
+        if isinstance(value, (tuple, list)):
+            if len(value) != 2:
+                raise DMRGException('Bad range for {0}'.format(key))
+            conditions.append('{0} between ? and ?'.format(meta_column(key)))
+            params += tuple(value)
+        else:
+            conditions.append('{0} = ?'.format(meta_column(key)))
+            params += (value,)
+    return ' and '.join(conditions), params
+
+def site_predicate(site_expressions, arity=None):
+    '''Compiles site expressions into a condition on the site columns.
+
+    The expressions are the ones you use in `generate_indexes`, e.g. 'i',
+    '2*i+1', or '3', one for each single-site operator of the estimator. A
+    row matches if there is a value of the mute index, the same for all the
+    expressions, that gives its sites, and the sites are in increasing
+    order. If all the expressions are constants, the sites must be these.
+    The condition is checked by sqlite, so you get only the rows that match.
+
+    Parameters
+    ----------
+    site_expressions: a list of strings.
+        The expressions for the sites. A single string for estimators with
+        one site.
+    arity: an int (defaulted to None).
+        If not None, the number of sites of the estimator, which must be the
+        number of expressions.
+
+    Returns
+    -------
+    a string with the condition, in SQL.
+
+    Raises
+    ------
+    DMRGException: if an expression is not right, or there are not as many
+    as sites.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.query_builder import site_predicate
+    >>> print site_predicate(['2*i+1', '2*i+2'])
+    (site0 - 1) >= 0 and (site0 - 1) % 2 = 0 and site1 = 2 * ((site0 - 1) / 2) + 2 and site0 < site1
+    >>> print site_predicate('3')
+    site0 = 3
+    '''
+    if isinstance(site_expressions, basestring):
+        site_expressions = [site_expressions]
+    if arity is not None and len(site_expressions) != arity:
+        raise DMRGException('Wrong number of site expressions')
+    site_filters = map(SiteFilter, site_expressions)
+    columns = site_columns(len(site_filters))
+
+    conditions = []
+    index = None
+    for column, site_filter in izip(columns, site_filters):
+        if site_filter.is_constant():
+            conditions.append('{0} = {1}'.format(column, int(site_filter.a)))
+            continue
+        a = int(site_filter.a or 1)
+        b = int(site_filter.b or 0) * (-1 if site_filter.pm == '-' else 1)
+        if index is None:
+            # the first site gives the value of the mute index
+            index = shift(column, b)
+            conditions.append('{0} >= 0'.format(index))
+            if a != 1:
+                conditions.append('{0} % {1} = 0'.format(index, a))
+                index = '({0} / {1})'.format(index, a)
+        else:
+            expression = index if a == 1 else '{0} * {1}'.format(a, index)
+            if b != 0:
+                expression += ' {0} {1}'.format('-' if b < 0 else '+', abs(b))
+            conditions.append('{0} = {1}'.format(column, expression))
+
+    if index is not None:
+        conditions.extend('{0} < {1}'.format(x, y) 
+                          for x, y in izip(columns[:-1], columns[1:]))
+    return ' and '.join(conditions)
+
+def shift(column, b):
+    '''Returns the SQL for a column minus a constant.
+    '''
+    if b == 0:
+        return column
+    return '({0} {1} {2})'.format(column, '+' if b < 0 else '-', abs(b))
@@ -0,0 +1,102 @@
+'''A cache for the estimators got from a database.
+'''
+from collections import OrderedDict
+
+class QueryCache(object):
+    """A cache, bounded in size, of the estimators got from a database.
+
+    You use this class to avoid running the same query over and over, when
+    you ask a Database for the same estimator many times. The estimators are
+    kept by the name, the site expression and the metadata filter you used to
+    get them. When the cache is full, the estimator used least recently is
+    dropped.
+
+    The estimators in the cache are shared by everyone who asks for them, so
+    you must not modify them. The database clears the cache whenever its
+    data change.
+
+    Parameters
+    ----------
+    maxsize: an int (defaulted to 0).
+        The number of estimators kept in the cache. If 0, nothing is kept.
+
+    Attributes
+    ----------
+    hits: an int.
+        The number of times an estimator was found in the cache.
+    misses: an int.
+        The number of times an estimator was not found in the cache.
+    evictions: an int.
+        The number of estimators dropped because the cache was full.
+    """
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the estimator kept for a key, or None if there is none.
+
+        Parameters
+        ----------
+        key: a tuple.
+            The key, as returned by `make_key`.
+        """
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        # put it back at the end, as the most recently used
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Keeps an estimator in the cache.
+
+        Parameters
+        ----------
+        key: a tuple.
+            The key, as returned by `make_key`.
+        value: an Estimator.
+            The estimator to keep.
+        """
+        if self.maxsize <= 0:
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops all the estimators in the cache.
+
+        The counters are kept.
+        """
+        self.entries.clear()
+
+def make_key(estimator_name, site_expression=None, meta=None):
+    """Returns the key in a QueryCache for the arguments of `get_estimator`.
+
+    Example
+    -------
+    >>> from dmrg_helpers.extract.query_cache import make_key
+    >>> make_key('n*n', ['i', 'i+1'], {'Kring': [0.0, 0.5]})
+    ('n*n', ('i', 'i+1'), (('Kring', (0.0, 0.5)),))
+    """
+    if site_expression is not None and not isinstance(site_expression,
+                                                      basestring):
+        site_expression = tuple(site_expression)
+    if meta:
+        meta = tuple(sorted((key, tuple(value)
+                                  if isinstance(value, list) else value)
+                            for key, value in meta.iteritems()))
+    else:
+        meta = None
+    return (estimator_name, site_expression, meta)
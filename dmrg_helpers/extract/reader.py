@@ -5,8 +5,10 @@
 """ A module to read estimator files.
 """
 import os
+import string
 from dmrg_helpers.core.dmrg_exceptions import DMRGException
 from dmrg_helpers.core.dmrg_logging import logger 
+from dmrg_helpers.extract.open_estimator_file import open_estimator_file
 
 def is_empty_line(line):
     """Checks whether a line is empty.
@@ -23,12 +25,25 @@ class FileReader(object):
     Reads an estimators.dat file and extracts the data from the estimators
     stored there.
 
+    Parameters
+    ----------
+    estimators: a list of strings (defaulted to None).
+        If not None, only the data for these estimators are extracted. The
+        names are the operators acting in each site, in order, and separated
+        by '*', as in `Database.get_estimator`, e.g. 's_z*s_z'. The rest of
+        lines are skipped before converting their values.
     """
-    def __init__(self):
+    def __init__(self, estimators=None):
         super(FileReader, self).__init__()
         self.comments = []
         self.data = []
         self.meta = {}
+        self.estimators = None
+        if estimators is not None:
+            if isinstance(estimators, basestring):
+                estimators = [estimators]
+            self.estimators = frozenset(estimators)
+            self.prefixes = tuple(e.split('*')[0] + '_' for e in estimators)
 
     def read(self, filename):
         """Reads a file and extracts the data.
@@ -37,7 +52,39 @@ class FileReader(object):
         ----------
         filename: a string.
             The filename of the estimators file. The file must exist. If you
-            pass a relative path it will be made absolute.
+            pass a relative path it will be made absolute. The file can be
+            compressed with gzip, bz2, or xz.
+
+        Raises
+        ------
+        DMRGException: if the file does not exist.
+        """
+        for record in self.stream(filename):
+            self.data.append(record)
+
+        logger.info('File {0} has been read'.format(self.filename))
+
+    def stream(self, filename):
+        """Reads a file lazily, yielding the data one line at a time.
+
+        You use this function instead of `read` when you don't want to keep
+        all the data of the file in memory: only the line being parsed is.
+        Comments and metadata are still collected in `comments` and `meta`
+        as they are found, so the metadata is complete once you exhaust the
+        generator.
+
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators file. The file must exist. If you
+            pass a relative path it will be made absolute. The file can be
+            compressed with gzip, bz2, or xz.
+
+        Returns
+        -------
+        a generator of 2-lists with a string and a float.
+            The name of each correlator and its value, in the order they are
+            in the file.
 
         Raises
         ------
@@ -49,13 +96,16 @@ class FileReader(object):
             raise DMRGException('File does not exist')
 
         self.filename = filename
+        return self.generate_records(filename)
 
-        with  open(filename, 'r') as f:
-            lines = f.readlines()
-        for line in lines:
-            self.validate_line(line)
-
-        logger.info('File {0} has been read'.format(filename))
+    def generate_records(self, filename):
+        """Yields the data lines of the file, one at a time.
+        """
+        with open_estimator_file(filename) as f:
+            for line in f:
+                record = self.parse_line(line)
+                if record is not None:
+                    yield record
 
     def validate_line(self, line):
         """Checks whether a line is OK, and if so gets its data.
@@ -75,17 +125,56 @@ class FileReader(object):
         line: a string
             A line from the estimators file.
         """
+        record = self.parse_line(line)
+        if record is not None:
+            self.data.append(record)
+
+    def parse_line(self, line):
+        """Parses a line, storing comments and metadata as they come.
+
+        Parameters
+        ----------
+        line: a string
+            A line from the estimators file.
+
+        Returns
+        -------
+        a 2-list with a string and a float, or None if the line is a comment
+        or is empty.
+        """
         if self.is_comment(line):
             self.comments.append(line)
+            self.extract_meta_from_comment(line)
         elif is_empty_line(line):
             pass
         else:
             try:
-                tmp = self.extract_data_from_line(line)
-                self.data.append(tmp)
+                return self.extract_data_from_line(line)
             except:
                 raise DMRGException('Bad line in file')
-        self.extract_meta_from_comments()
+        return None
+
+    def is_wanted(self, name):
+        """Checks whether an estimator is one of the estimators wanted.
+
+        Most estimators are rejected just by looking at the name of their
+        first operator. For the rest, you remove the sites from the name,
+        which are the only digits in it, and compare.
+
+        Parameters
+        ----------
+        name: a string.
+            The name of the estimator, as in the first column of the file.
+
+        Returns
+        -------
+        a bool: whether the name is for one of the estimators in
+        `self.estimators`.
+        """
+        if not name.startswith(self.prefixes):
+            return False
+        name = name.translate(None, string.digits).replace('_*', '*')
+        return name[:-1] in self.estimators
 
     def is_comment(self, line):
         """Checks whether a line is a comment
@@ -112,11 +201,14 @@ class FileReader(object):
         Returns
         -------
         splitted_line: a 2-tuple with a string and a float
-            The name of the correlator and its value stored in this line.
+            The name of the correlator and its value stored in this line, or
+            None if the correlator is not one of the `estimators` wanted.
         """
         splitted_line = line.split()
         if len(splitted_line) != 2:
             raise DMRGException('Bad line in file')
+        if self.estimators is not None and not self.is_wanted(splitted_line[0]):
+            return None
         try:
             splitted_line[1] = float(splitted_line[1])
         except:
@@ -133,12 +225,22 @@ class FileReader(object):
         the metadata.
         """
         for c in self.comments:
-            splitted_line = c.split()
-            if "META" in splitted_line:
-                i = splitted_line.index('META')
-                splitted_line = splitted_line[i+1:]
-                if len(splitted_line) > 2:
-                    raise DMRGException('Bad metadata')
-                key = splitted_line[0]
-                value = splitted_line[1]
-                self.meta[key] = value
+            self.extract_meta_from_comment(c)
+
+    def extract_meta_from_comment(self, comment):
+        """Extracts metadata from a single comment line, if it has any.
+
+        Parameters
+        ----------
+        comment: a string.
+            A comment line from the estimators file.
+        """
+        splitted_line = comment.split()
+        if "META" in splitted_line:
+            i = splitted_line.index('META')
+            splitted_line = splitted_line[i+1:]
+            if len(splitted_line) > 2:
+                raise DMRGException('Bad metadata')
+            key = splitted_line[0]
+            value = splitted_line[1]
+            self.meta[key] = value
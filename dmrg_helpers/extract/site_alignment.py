@@ -0,0 +1,90 @@
+'''Functions to match the sites of the data of two estimators.
+'''
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+
+def site_keys(*sites):
+    '''Encodes the rows of arrays of sites as int64 keys.
+
+    The keys keep the lexicographic order of the rows, and equal rows get the
+    same key in all the arrays. When the sites are small enough, each row is
+    read as the digits of a number, otherwise the rows are numbered after
+    sorting them.
+
+    Parameters
+    ----------
+    sites: numpy arrays of ints with shape (n, arity).
+        The sites, with the same arity. They are not negative.
+
+    Returns
+    -------
+    a list with a numpy array of int64 for each array of sites, with the key
+    for each of its rows.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from dmrg_helpers.extract.site_alignment import site_keys
+    >>> keys, other_keys = site_keys(np.array([[0, 1], [2, 3]]),
+    ...                              np.array([[2, 3]]))
+    >>> keys.tolist(), other_keys.tolist()
+    ([1, 11], [11])
+    '''
+    if len(set(s.shape[1] for s in sites)) > 1:
+        raise DMRGException('Estimators with different number of sites')
+    both = np.concatenate(sites).astype(np.int64)
+    if not len(both):
+        return [np.zeros(len(s), dtype=np.int64) for s in sites]
+    dims = both.max(axis=0) + 1
+    if np.prod(dims.astype(float)) < 2.0**62:
+        keys = np.ravel_multi_index(both.T, dims)
+    else:
+        keys = np.unique(both, axis=0, return_inverse=True)[1]
+    keys = keys.astype(np.int64)
+    bounds = np.cumsum([len(s) for s in sites])[:-1]
+    return np.split(keys, bounds)
+
+def align_sites(*sites):
+    '''Finds the rows with the same sites in arrays of sites.
+
+    You use this function to join the data of estimators on their sites:
+    only the sites present in all of them are kept, as in an inner join.
+
+    Parameters
+    ----------
+    sites: numpy arrays of ints with shape (n, arity).
+        The sites of the data of each estimator. If the same sites are in
+        more than one row of an array, only the first is matched, unless
+        all the arrays are equal: see below.
+
+    Returns
+    -------
+    a list with a numpy array of ints for each array of sites, with the
+    rows that match, in the order of the sites. If all the arrays have the
+    same sites in the same order, as when the estimators were measured on
+    the same sites, all the rows are matched as they are, without looking
+    for repeated sites, so repeated rows are all kept.
+
+    Raises
+    ------
+    DMRGException: if the number of sites is not the same in all.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from dmrg_helpers.extract.site_alignment import align_sites
+    >>> indexes, other_indexes = align_sites(np.array([[0, 1], [1, 2]]),
+    ...                                      np.array([[1, 2], [2, 3]]))
+    >>> indexes.tolist(), other_indexes.tolist()
+    ([1], [0])
+    '''
+    if all(np.array_equal(s, sites[0]) for s in sites[1:]):
+        return [np.arange(len(s)) for s in sites]
+    keys = site_keys(*sites)
+    common = reduce(np.intersect1d, keys)
+    indexes = []
+    for k in keys:
+        # a stable sort, so the first of equal rows is found
+        order = np.argsort(k, kind='mergesort')
+        indexes.append(order[np.searchsorted(k[order], common)])
+    return indexes
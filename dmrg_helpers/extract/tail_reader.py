@@ -0,0 +1,149 @@
+#
+# File: tail_reader.py
+# Author: Ivan Gonzalez
+#
+""" A module to read estimator files that are still being written.
+"""
+import os
+import numpy as np
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.core.dmrg_logging import logger
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.open_estimator_file import detect_compression
+
+class TailFileReader(ColumnarFileReader):
+    """A file reader that reads only what was appended since the last read.
+
+    DMRG runs append to their estimators file as they sweep. You use this
+    class to follow such a file: each call to `read` parses only the bytes
+    appended to the file since the previous call, so the cost of each read
+    is proportional to the new output, not to the size of the file.
+
+    The reader remembers the byte offset where the previous read stopped.
+    The last line of the file may be still half-written, so the text after
+    the last newline is kept aside and parsed in the next read, together
+    with the rest of that line.
+
+    After each read, `codes`, `sites` and `values` hold only the new rows.
+    The comments accumulate over all the reads. The metadata are only taken
+    from the comments before the first data line of the file: the rows
+    already read would have different parameters otherwise, so a later
+    `# META` comment is logged and ignored.
+
+    If the file is shorter than the offset, it has been truncated or written
+    again from scratch, and the next read starts again from the beginning.
+
+    Compressed files cannot be read this way.
+
+    Parameters
+    ----------
+    estimators: a list of strings (defaulted to None).
+        If not None, only the rows for these estimators, e.g. 's_z*s_z', are
+        kept.
+
+    Attributes
+    ----------
+    offset: an int.
+        The number of bytes of the file read so far.
+    partial: a string.
+        The text of the last line of the file, if it had no newline yet.
+    restarted: a bool.
+        Whether the last read started again from the beginning of the file,
+        because the file was truncated.
+    data_started: a bool.
+        Whether a data line has been read, after which the metadata are
+        fixed.
+    """
+    def __init__(self, estimators=None):
+        super(TailFileReader, self).__init__(estimators)
+        self.filename = None
+        self.offset = 0
+        self.partial = ''
+        self.restarted = False
+        self.data_started = False
+
+    def read(self, filename):
+        """Reads the data appended to a file since the last read.
+
+        Parameters
+        ----------
+        filename: a string.
+            The filename of the estimators file. The file must exist. If you
+            pass a relative path it will be made absolute.
+
+        Raises
+        ------
+        DMRGException: if the file does not exist, is compressed, is not the
+        file read before, or it is not properly formatted.
+        """
+        if os.path.exists(filename):
+            filename = os.path.abspath(filename)
+        else:
+            raise DMRGException('File does not exist')
+        if detect_compression(filename) is not None:
+            raise DMRGException('Cannot tail a compressed file')
+        if self.filename is None:
+            self.filename = filename
+        elif self.filename != filename:
+            raise DMRGException('Cannot tail a different file')
+
+        self.restarted = os.path.getsize(filename) < self.offset
+        if self.restarted:
+            logger.info('File {0} was truncated, reading it again'.format(
+                filename))
+            self.rewind()
+
+        with open(filename, 'r') as f:
+            f.seek(self.offset)
+            text = self.partial + f.read()
+            self.offset = f.tell()
+
+        end = text.rfind('\n') + 1
+        self.partial = text[end:]
+        self.codes = np.zeros(0, dtype=np.int32)
+        self.sites = np.zeros((0, 0), dtype=np.int32)
+        self.values = np.zeros(0, dtype=np.float64)
+        self.operators = []
+        header = 0 if self.data_started else header_length(text[:end])
+        self.parse(text[:header])
+        meta = dict(self.meta)
+        self.parse(text[header:end])
+        if self.meta != meta:
+            logger.info('Metadata after the data in {0} ignored'.format(
+                filename))
+            self.meta = meta
+        self.data_started = self.data_started or header < end
+
+        logger.info('File {0} has been read up to byte {1}'.format(
+            filename, self.offset - len(self.partial)))
+
+    def rewind(self):
+        """Forgets everything read so far, to read the file from the start.
+        """
+        self.offset = 0
+        self.partial = ''
+        self.comments = []
+        self.meta = {}
+        self.data_started = False
+
+def header_length(text):
+    """Finds where the first data line of a text starts.
+
+    Parameters
+    ----------
+    text: a string.
+        Whole lines of an estimators file.
+
+    Returns
+    -------
+    an int with the position of the first line that is not a comment nor
+    blank, or the length of the text if there is none.
+    """
+    start = 0
+    while start < len(text):
+        end = (text.find('\n', start) + 1) or len(text)
+        line = text[start:end]
+        if not line.startswith('#') and line.strip():
+            break
+        start = end
+    return start
@@ -149,7 +149,8 @@ def main(args):
 
         # Create a database with all the files under dir
 
-        db = create_db_from_dir(args['--in'])
+        db = create_db_from_dir(args['--in'], 
+                                estimators=['s_z*s_z', 'n*n', 'n'])
         
         # Calculate the structure factors
 
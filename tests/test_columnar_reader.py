@@ -0,0 +1,97 @@
+""" Tests for the columnar reader class.
+"""
+import numpy as np
+from nose.tools import raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.operator_table import operator_table
+from dmrg_helpers.extract.reader import FileReader
+    
+class TestColumnarFileReader(object):
+
+    def setUp(self):
+        self.reader = ColumnarFileReader()
+
+    def test_empty_file(self):
+        self.reader.read('tests/empty.dat')
+        assert len(self.reader) == 0
+        assert self.reader.meta == {}
+        assert self.reader.comments == []
+
+    def test_only_whitespace_file(self):
+        self.reader.read('tests/only_whitespace.dat')
+        assert len(self.reader) == 0
+
+    def test_file_two_point_estimators(self):
+        self.reader.read('tests/file_two_point_estimators.dat')
+        assert self.reader.operators == ['n_up', 'n_up*n_up']
+        n_up, n_up_n_up = [operator_table.ids[o] for o in self.reader.operators]
+        assert self.reader.codes.tolist() == [n_up, n_up, n_up_n_up, n_up_n_up]
+        assert self.reader.sites.tolist() == [[0, -1], [1, -1], [0, 1], [1, 2]]
+        assert self.reader.values.tolist() == [1.0, 2.0, 3.0, 4.0]
+        assert self.reader.meta['parameter_1'] == '1.0'
+        sites, values = self.reader.select('n_up*n_up')
+        assert sites.tolist() == [[0, 1], [1, 2]]
+        assert values.tolist() == [3.0, 4.0]
+
+    def test_same_as_file_reader(self):
+        filename = 'tests/real_data/static/estimators.dat'
+        self.reader.read(filename)
+        file_reader = FileReader()
+        file_reader.read(filename)
+        assert self.reader.meta == file_reader.meta
+        assert self.reader.comments == file_reader.comments
+        values = np.array([d[1] for d in file_reader.data])
+        assert np.array_equal(self.reader.values, values)
+        sites, values = self.reader.select('s_m_dag*s_m*s_z*s_z')
+        assert len(values) == 4371
+
+    def test_comments_and_whitespace_between_data(self):
+        self.reader.parse('n_up_0 1.0\n   \n# META L 2\nn_up_1 2.0')
+        assert self.reader.comments == ['# META L 2\n']
+        assert self.reader.meta == {'L': '2'}
+        assert self.reader.sites.tolist() == [[0], [1]]
+        assert self.reader.values.tolist() == [1.0, 2.0]
+
+    def test_only_some_estimators(self):
+        filename = 'tests/real_data/static/estimators.dat'
+        reader = ColumnarFileReader(estimators=['s_z*s_z', 'n'])
+        reader.read(filename)
+        assert reader.operators == ['n', 's_z*s_z']
+        self.reader.read(filename)
+        for operator in reader.operators:
+            sites, values = reader.select(operator)
+            all_sites, all_values = self.reader.select(operator)
+            assert np.array_equal(sites, all_sites)
+            assert np.array_equal(values, all_values)
+        assert len(reader) == 96 + 4560
+
+    @raises(DMRGException)
+    def test_bad_operator_name(self):
+        self.reader.parse('n_up_0 1.0\nn_up 2.0\n')
+
+    @raises(DMRGException)
+    def test_bad_value(self):
+        self.reader.parse('n_up_0 1.0\nn_up_1 a_string\n')
+
+    @raises(DMRGException)
+    def test_bad_number_of_columns(self):
+        self.reader.parse('n_up_0 1.0 2.0\n')
+
+    @raises(DMRGException)
+    def test_name_and_value_in_different_lines(self):
+        self.reader.parse('n_up_0 1.0 n_up_1\n2.0\n')
+
+    @raises(DMRGException)
+    def test_two_rows_in_a_line(self):
+        self.reader.parse('n_up_0 1.0 n_up_1 2.0\n')
+
+    @raises(DMRGException)
+    def test_digits_in_operator_name(self):
+        # all the digits in a name are taken as sites
+        self.reader.parse('n2_0 1.0\n')
+
+    @raises(DMRGException)
+    def test_bad_operator_names_that_add_up(self):
+        # one site too few in a row and one too many in the next
+        self.reader.parse('n_up 1.0\nn_up_1_2 2.0\n')
@@ -0,0 +1,41 @@
+'''
+Test for the connected correlators.
+'''
+import numpy as np
+from nose.tools import raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.database import Database
+from dmrg_helpers.extract.estimator import Estimator
+from dmrg_helpers.analyze.connected import connected
+
+def test_real_data():
+    db = Database()
+    db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    for two_point, one_point in [('n*n', 'n'), ('s_z*s_z', 's_z')]:
+        two_point, one_point = db.get_estimators([two_point, one_point])
+        result = connected(two_point, one_point)
+        for key, data in two_point.data.iteritems():
+            values = dict(zip(one_point.data[key].x(), 
+                              one_point.data[key].y()))
+            expected = [v - values[i] * values[j] 
+                        for (i, j), v in zip(data.sites(), data.y())]
+            assert result.data[key].sites() == data.sites()
+            assert np.allclose(result.data[key].y(), expected)
+
+def test_unordered_and_missing_sites():
+    two_point = Estimator('a*b', 'parameter_1')
+    two_point.add_columns(np.array([[0, 1], [1, 2], [0, 3]]), 
+                          np.array([1., 2., 3.]), '1.0')
+    two_point.add_columns(np.array([[0, 1]]), np.array([1.]), '2.0')
+    a = Estimator('a', 'parameter_1')
+    a.add_columns(np.array([[1], [0]]), np.array([2., 3.]), '1.0')
+    b = Estimator('b', 'parameter_1')
+    b.add_columns(np.array([[2], [1], [0]]), np.array([5., 7., 11.]), '1.0')
+    result = connected(two_point, a, b)
+    assert result.data.keys() == ['1.0']
+    assert result.data['1.0'].sites() == [(0, 1), (1, 2)]
+    assert result.data['1.0'].y() == [1. - 3. * 7., 2. - 2. * 5.]
+
+@raises(DMRGException)
+def test_different_meta_keys():
+    connected(Estimator('a*a', 'parameter_1'), Estimator('a', 'parameter_2'))
@@ -2,8 +2,15 @@
 Test for the database class.
 '''
 import os
-from nose.tools import with_setup
-from dmrg_helpers.extract.database import Database
+import shutil
+import tempfile
+import numpy as np
+from nose.tools import with_setup, raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.generate_indexes import generate_indexes
+from dmrg_helpers.extract.database import Database, group_by_run
+from dmrg_helpers.extract.query_builder import (select_estimator, 
+                                                select_estimators)
 
 def setup_function():
     pass
@@ -32,3 +39,173 @@ def test_database_from_two_point_correlators():
     assert len(db.get_estimator('n_up')) == 1
     assert len(db.get_estimator('n_down')) == 0
     assert len(db.get_estimator('n_up*n_up')) == 1
+
+@with_setup(setup_function, teardown_function)
+def test_bulk_load():
+    db = Database('tests/db_test.sqlite3')
+    synchronous = db.c.execute('pragma synchronous').fetchone()
+    with db.bulk_load():
+        assert db.c.execute("select count(*) from sqlite_master where \
+                             tbl_name = 'estimators'").fetchone() == (1,)
+        assert db.c.execute('pragma synchronous').fetchone() == (0,)
+        db.insert_data_from_file('tests/file_one.dat')
+        db.insert_data_from_file('tests/file_two.dat')
+    assert db.c.execute("select name from sqlite_master where \
+                         tbl_name = 'estimators'").fetchall() == [
+                             ('estimators',), ('estimators_operator_run',)]
+    assert db.c.execute('pragma synchronous').fetchone() == synchronous
+    assert len(db.get_estimator('n_up')) == 1
+    assert len(db.get_estimator('n_down')) == 1
+
+@with_setup(setup_function, teardown_function)
+def test_normalized_schema():
+    db = Database('tests/db_test.sqlite3')
+    db.insert_data_from_file('tests/file_two_point_estimators.dat')
+    assert db.c.execute('select name from operators').fetchall() == [
+        ('n_up',), ('n_up*n_up',)]
+    assert db.c.execute('select meta_values from runs').fetchall() == [
+        ('1.0:a_string',)]
+    assert db.c.execute('select arity, site0, site1, data from estimators \
+                         order by rowid').fetchall() == [
+        (1, 0, None, 1.0), (1, 1, None, 2.0), (2, 0, 1, 3.0), (2, 1, 2, 4.0)]
+    n_up_n_up = db.get_estimator('n_up*n_up').data['1.0:a_string']
+    assert n_up_n_up.sites() == [(0, 1), (1, 2)]
+
+def test_explain():
+    db = Database()
+    plan = ' '.join(db.explain(*select_estimator('n_up', run_id=1)))
+    assert 'USING INDEX estimators_operator_run' in plan
+    assert 'SCAN' not in plan
+
+def test_site_expression():
+    db = Database()
+    db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    s_z_s_z = db.get_estimator('s_z*s_z')
+    key, all_data = s_z_s_z.data.items()[0]
+    length = int(s_z_s_z.get_metadata_as_dict(key)['numberOfSites'])
+    for expression in [['i', 'i+1'], ['2*i', '2*i+1'], ['2*i+1', '2*i+4'],
+                       ['0', 'i'], ['i', '10'], ['3', '7'], ['i+2', 'i']]:
+        expected = set(map(tuple, generate_indexes(expression, length)))
+        expected = sorted((s, v) for s, v in zip(all_data.sites(), 
+                                                 all_data.y())
+                          if s in expected)
+        fetched = db.get_estimator('s_z*s_z', expression).data
+        fetched = fetched.values()[0] if fetched else None
+        assert expected == (sorted(zip(fetched.sites(), fetched.y())) 
+                            if fetched else [])
+
+@raises(DMRGException)
+def test_site_expression_with_wrong_number_of_sites():
+    db = Database()
+    db.insert_data_from_file('tests/file_two_point_estimators.dat')
+    db.get_estimator('n_up*n_up', ['i'])
+
+def test_fetch_columns():
+    db = Database()
+    db.insert_data_from_file('tests/file_two_point_estimators.dat')
+    operator_ids, run_ids, sites, values = db.fetch_columns(
+        *select_estimators(['n_up', 'n_up*n_up']), chunk_size=1)
+    assert sites.dtype == np.int32
+    groups = dict(((db.get_operator_id(name), 1), (s, v)) for name, s, v in
+                  [('n_up', [[0, -1], [1, -1]], [1.0, 2.0]),
+                   ('n_up*n_up', [[0, 1], [1, 2]], [3.0, 4.0])])
+    for group in group_by_run(operator_ids, run_ids, sites, values):
+        expected_sites, expected_values = groups.pop(group[:2])
+        assert np.array_equal(group[2], expected_sites)
+        assert np.array_equal(group[3], expected_values)
+    assert not groups
+
+def test_get_estimators():
+    db = Database()
+    db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    names = ['s_z*s_z', 'n', 'not_there', 'n*n']
+    estimators = db.get_estimators(names)
+    assert len(estimators) == len(names)
+    assert estimators[2].data == {}
+    for name, estimator in zip(names, estimators):
+        expected = db.get_estimator(name)
+        assert estimator.name == name
+        assert sorted(expected.data.keys()) == sorted(estimator.data.keys())
+        for key, data in expected.data.iteritems():
+            assert (sorted(zip(data.sites(), data.y())) ==
+                    sorted(zip(estimator.data[key].sites(),
+                               estimator.data[key].y())))
+
+class TestMetaQueries(object):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database()
+        with open('tests/file_two_point_estimators.dat') as f:
+            contents = f.read()
+        for i, value in enumerate(['1.0', '2.0', '10.0']):
+            filename = os.path.join(self.tmp_dir, 
+                                    'estimators_{0}.dat'.format(i))
+            with open(filename, 'w') as f:
+                f.write(contents.replace('parameter_1 1.0', 
+                                         'parameter_1 ' + value))
+            self.db.insert_data_from_file(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_values(self, meta):
+        return sorted(self.db.get_estimator('n_up', meta=meta).data.keys())
+
+    def test_equal(self):
+        assert self.get_values({'parameter_1': 10}) == ['10.0:a_string']
+        assert self.get_values({'parameter_1': '2.0'}) == ['2.0:a_string']
+        assert len(self.get_values({'parameter_2': 'a_string'})) == 3
+        assert self.get_values({'parameter_2': 'b_string'}) == []
+
+    def test_range(self):
+        # numbers are compared as numbers, not as strings
+        assert self.get_values({'parameter_1': (1.5, 10)}) == [
+            '10.0:a_string', '2.0:a_string']
+        assert self.get_values({'parameter_1': (0, 1), 
+                                'parameter_2': 'a_string'}) == [
+            '1.0:a_string']
+
+    @raises(DMRGException)
+    def test_bad_key(self):
+        self.get_values({'numberOfSites': 96})
+
+class TestReplaceFile(object):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'estimators.dat')
+        shutil.copy('tests/file_two_point_estimators.dat', self.filename)
+        self.db = Database()
+        self.db.insert_data_from_file(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def replace_file(self, old, new):
+        with open(self.filename) as f:
+            contents = f.read()
+        with open(self.filename, 'w') as f:
+            f.write(contents.replace(old, new))
+        try:
+            self.db.insert_data_from_file(self.filename)
+        except DMRGException:
+            pass
+        else:
+            assert False, 'The file was inserted'
+
+    def check_old_data(self):
+        assert self.db.number_of_runs() == 1
+        n_up = self.db.get_estimator('n_up').data['1.0:a_string']
+        assert n_up.y() == [1.0, 2.0]
+        assert not self.db.is_up_to_date(self.filename)
+        self.db.c.execute('select count(*) from manifest')
+        assert self.db.c.fetchone() == (1,)
+
+    def test_malformed_file(self):
+        self.replace_file('n_up_1 2.0', 'n_up_1 two')
+        self.check_old_data()
+
+    def test_incompatible_file(self):
+        self.replace_file('# META parameter_2 a_string\n', '')
+        self.check_old_data()
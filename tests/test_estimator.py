@@ -2,8 +2,13 @@
 Test for the database class.
 '''
 import os
-from nose.tools import with_setup
+import numpy as np
+from nose.tools import with_setup, raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
 from dmrg_helpers.extract.database import Database
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.estimator import Estimator, EstimatorData
+from dmrg_helpers.extract.estimator_site import EstimatorSite
 
 def setup_function():
     pass
@@ -34,3 +39,74 @@ def test_save():
         from_file = f.read()
     assert from_file == contents
     os.remove('tests/n_up_parameter_1_1.0_parameter_2_a_string.dat')
+
+def test_add_columnar_data():
+    reader = ColumnarFileReader()
+    reader.read('tests/file_two_point_estimators.dat')
+    n_up = Estimator('n_up*n_up', 'parameter_1:parameter_2')
+    n_up.add_columnar_data(reader, '1.0:a_string')
+    assert len(n_up) == 1
+    assert n_up.data['1.0:a_string'].sites() == [(0, 1), (1, 2)]
+    assert n_up.data['1.0:a_string'].y() == [3.0, 4.0]
+
+def test_estimator_data():
+    data = EstimatorData()
+    data.add(EstimatorSite(('0', '1')), 3.0)
+    data.add((1, 2), 4.0)
+    y = data.y_as_np()
+    assert y is data.y_as_np()
+    assert not y.flags.writeable
+    data.extend(np.arange(40, dtype=np.int32).reshape(20, 2), np.ones(20))
+    assert len(data) == 22
+    assert data.sites()[:3] == [(0, 1), (1, 2), (0, 1)]
+    assert data.x()[:3] == [0, 1, 0]
+    assert data.y()[:3] == [3.0, 4.0, 1.0]
+    assert data.x_as_np().dtype == np.int32
+    assert [s.sites for s in data.sites_list[:2]] == [(0, 1), (1, 2)]
+    assert np.array_equal(y, [3.0, 4.0])
+
+@raises(DMRGException)
+def test_estimator_data_with_wrong_number_of_sites():
+    data = EstimatorData()
+    data.add((0, 1), 1.0)
+    data.add((0,), 1.0)
+
+def test_arithmetic():
+    db = Database()
+    db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    uu, dd, ud, du, n_n, s_z_s_z = db.get_estimators(
+        ['n_up*n_up', 'n_down*n_down', 'n_up*n_down', 'n_down*n_up', 'n*n',
+         's_z*s_z'])
+    key = n_n.data.keys()[0]
+    for combination, expected in [(uu + dd + ud + du, n_n),
+                                  (0.25 * (uu + dd - ud - du), s_z_s_z),
+                                  (-uu * 2, uu * -2.0)]:
+        difference = (combination - expected).data[key]
+        assert len(difference) == len(expected.data[key])
+        assert np.allclose(difference.y_as_np(), 0)
+    difference = (sum([uu, dd, ud, du]) - n_n).data[key]
+    assert np.allclose(difference.y_as_np(), 0)
+    values = dict(zip(uu.data[key].sites(), uu.data[key].y()))
+    squared = (uu * uu).data[key]
+    assert np.allclose(squared.y_as_np(), 
+                       [values[s]**2 for s in squared.sites()])
+
+def test_arithmetic_keeps_common_sites():
+    a = Estimator('a', 'parameter_1')
+    a.add_columns(np.array([[0, 1], [1, 2], [2, 3]]), np.array([1., 2., 3.]),
+                  '1.0')
+    a.add_columns(np.array([[0, 1]]), np.array([1.]), '2.0')
+    b = Estimator('b', 'parameter_1')
+    b.add_columns(np.array([[2, 3], [0, 1]]), np.array([10., 20.]), '1.0')
+    result = a + b
+    assert result.data.keys() == ['1.0']
+    assert result.data['1.0'].sites() == [(0, 1), (2, 3)]
+    assert result.data['1.0'].y() == [21., 13.]
+
+@raises(DMRGException)
+def test_arithmetic_with_different_meta_keys():
+    Estimator('a', 'parameter_1') + Estimator('b', 'parameter_2')
+
+@raises(TypeError)
+def test_add_a_number():
+    1 + Estimator('a', 'parameter_1')
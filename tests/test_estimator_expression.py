@@ -0,0 +1,40 @@
+'''
+Test for the lazy expressions of estimators.
+'''
+import numpy as np
+from nose.tools import raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.database import Database
+from dmrg_helpers.extract.estimator_expression import (EstimatorExpression,
+                                                     LazyEstimator, Constant)
+
+names = ['n_up*n_up', 'n_down*n_down', 'n_up*n_down', 'n_down*n_up']
+
+def test_same_as_estimators():
+    db = Database(cache_size=8)
+    db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    uu, dd, ud, du = map(LazyEstimator, names)
+    lazy = (0.25 * (uu + dd - ud - du) + 2 * uu * uu - 1).evaluate(db)
+    uu, dd, ud, du = db.get_estimators(names)
+    eager = 0.25 * (uu + dd - ud - du) + 2.0 * (uu * uu)
+    assert db.query_cache.misses == 4
+    assert lazy.data.keys() == eager.data.keys()
+    for key, data in eager.data.iteritems():
+        assert lazy.data[key].sites() == data.sites()
+        assert np.allclose(lazy.data[key].y_as_np(), data.y_as_np() - 1)
+
+def test_names():
+    uu, dd = map(LazyEstimator, names[:2])
+    expression = -(uu - 2 * dd) * uu
+    assert str(expression) == '(-(n_up*n_up - (2 * n_down*n_down))) * n_up*n_up'
+    assert expression.estimator_names() == set(names[:2])
+
+@raises(DMRGException)
+def test_no_estimators():
+    db = Database()
+    db.insert_data_from_file('tests/real_data/static/estimators.dat')
+    (Constant(1) + 2).evaluate(db)
+
+@raises(TypeError)
+def test_base_class_is_abstract():
+    EstimatorExpression()
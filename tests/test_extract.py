@@ -2,8 +2,14 @@
 Test for the database class.
 '''
 import os
-from nose.tools import with_setup
+import signal
+import shutil
+import tempfile
+from nose.tools import with_setup, raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
 import dmrg_helpers.extract.extract as ex
+import dmrg_helpers.extract.parallel_ingest as pi
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
 
 def setup_function():
     pass
@@ -36,3 +42,115 @@ def test_create_db_from_file_with_real_data():
     assert len(db.get_estimator('n_up')) == 1
     assert len(db.get_estimator('s_z*s_z')) == 1
     assert len(db.get_estimator('s_m_dag*s_m')) == 1
+
+@with_setup(setup_function, teardown_function)
+def test_create_db_from_file_only_some_estimators():
+    db = ex.create_db_from_file('tests/real_data/static/estimators.dat', 
+                                'tests/db_test.sqlite3', ['s_z*s_z'])
+    assert len(db.get_estimator('n_up')) == 0
+    assert len(db.get_estimator('s_z*s_z')) == 1
+
+class TestAppend(object):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        for run in ['run_1', 'run_2']:
+            os.mkdir(os.path.join(self.tmp_dir, run))
+        shutil.copy('tests/file_one.dat', 
+                    os.path.join(self.tmp_dir, 'run_1', 'estimators.dat'))
+        self.db_name = os.path.join(self.tmp_dir, 'db.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def count(self, db, table):
+        return db.c.execute('select count(*) from ' + table).fetchone()[0]
+
+    def test_append(self):
+        db = ex.create_db_from_dir(self.tmp_dir, self.db_name)
+        assert self.count(db, 'manifest') == 1
+        del db
+        shutil.copy('tests/file_two.dat', 
+                    os.path.join(self.tmp_dir, 'run_2', 'estimators.dat'))
+        db = ex.create_db_from_dir(self.tmp_dir, self.db_name, append=True)
+        assert self.count(db, 'manifest') == 2
+        assert self.count(db, 'runs') == 2
+        assert len(db.get_estimator('n_up')) == 1
+        assert len(db.get_estimator('n_down')) == 1
+
+    def test_unchanged_file_is_skipped(self):
+        db = ex.create_db_from_dir(self.tmp_dir, self.db_name)
+        rows = self.count(db, 'estimators')
+        del db
+        # touching the file does not change its contents
+        os.utime(os.path.join(self.tmp_dir, 'run_1', 'estimators.dat'), 
+                 (0, 0))
+        db = ex.create_db_from_dir(self.tmp_dir, self.db_name, append=True)
+        assert self.count(db, 'estimators') == rows
+        assert db.c.execute('select run_id from manifest').fetchone() == (1,)
+
+    def test_changed_file_is_replaced(self):
+        db = ex.create_db_from_dir(self.tmp_dir, self.db_name)
+        del db
+        shutil.copy('tests/file_two.dat', 
+                    os.path.join(self.tmp_dir, 'run_1', 'estimators.dat'))
+        db = ex.create_db_from_dir(self.tmp_dir, self.db_name, append=True)
+        assert self.count(db, 'runs') == 1
+        assert len(db.get_estimator('n_up')) == 0
+        assert len(db.get_estimator('n_down')) == 1
+
+    @raises(DMRGException)
+    def test_no_append(self):
+        ex.create_db_from_dir(self.tmp_dir, self.db_name)
+        ex.create_db_from_dir(self.tmp_dir, self.db_name)
+
+@with_setup(setup_function, teardown_function)
+def test_create_db_from_files_in_parallel():
+    files = ['tests/file_one.dat', 'tests/file_two.dat', 
+             'tests/file_two_point_estimators.dat']
+    db = ex.create_db_from_files_in_parallel(files, 'tests/db_test.sqlite3',
+                                             processes=2, batch_size=1,
+                                             queue_size=2)
+    serial_db = ex.create_db_from_files(files)
+    for name in ['n_up', 'n_down', 'n_up*n_up']:
+        data = db.get_estimator(name).data
+        serial_data = serial_db.get_estimator(name).data
+        assert data.keys() == serial_data.keys()
+        for key in data:
+            assert sorted(zip(data[key].sites(), data[key].y())) == sorted(
+                zip(serial_data[key].sites(), serial_data[key].y()))
+    assert db.c.execute('select count(*) from manifest').fetchone() == (3,)
+
+@with_setup(setup_function, teardown_function)
+def test_create_db_from_files_in_parallel_with_bad_file():
+    files = ['tests/file_ok.dat', 'tests/file_two_point_estimators.dat',
+             'tests/file_that_does_not_exist.dat']
+    try:
+        ex.create_db_from_files_in_parallel(files, 'tests/db_test.sqlite3',
+                                            processes=2)
+        assert False
+    except DMRGException:
+        pass
+
+class KilledReader(ColumnarFileReader):
+    """A reader whose process dies when it reads 'file_two.dat'."""
+    def read(self, filename):
+        if filename.endswith('file_two.dat'):
+            os.kill(os.getpid(), signal.SIGKILL)
+        super(KilledReader, self).read(filename)
+
+@with_setup(setup_function, teardown_function)
+def test_create_db_from_files_in_parallel_with_dead_process():
+    files = ['tests/file_one.dat', 'tests/file_two.dat', 
+             'tests/file_two_point_estimators.dat']
+    reader, interval = pi.ColumnarFileReader, pi.poll_interval
+    # the processes of the pool are forked with the reader that dies
+    pi.ColumnarFileReader, pi.poll_interval = KilledReader, 0.1
+    try:
+        ex.create_db_from_files_in_parallel(files, 'tests/db_test.sqlite3',
+                                            processes=2)
+        assert False
+    except DMRGException:
+        pass
+    finally:
+        pi.ColumnarFileReader, pi.poll_interval = reader, interval
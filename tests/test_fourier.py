@@ -0,0 +1,68 @@
+'''
+Test for the Fourier transforms.
+'''
+import numpy as np
+from math import pi
+from dmrg_helpers.extract.estimator import Estimator, EstimatorData
+from dmrg_helpers.analyze.fourier import (
+    calculate_fourier_transform_for_two_point_estimator, 
+    calculate_fourier_transform_for_two_point_estimator_data, 
+    calculate_fourier_comp_for_two_point_estimator)
+
+def make_data(length):
+    data = EstimatorData()
+    i, j = np.triu_indices(length)
+    values = np.random.RandomState(0).normal(size=len(i))
+    data.extend(np.column_stack([i, j]), values)
+    return data
+
+def direct_transform(data, q, length):
+    sites = data.sites_as_np()
+    diff = sites[:, 0] - sites[:, 1]
+    return 2*np.sum(data.y_as_np()*np.cos(q*diff))/length
+
+def test_all_momenta():
+    length = 10
+    data = make_data(length)
+    result = calculate_fourier_transform_for_two_point_estimator_data(data,
+                                                                      length)
+    assert np.allclose(result.x(), 2*pi*np.arange(length)/length)
+    assert np.allclose(result.y(), [direct_transform(data, q, length) 
+                                    for q in result.x()])
+
+def test_given_momenta():
+    length = 10
+    data = make_data(length)
+    momenta = [0.1, 1.0, pi, 7.5]
+    result = calculate_fourier_transform_for_two_point_estimator_data(
+        data, length, momenta)
+    assert result.x().tolist() == momenta
+    assert np.allclose(result.y(), [direct_transform(data, q, length) 
+                                    for q in momenta])
+    assert np.isclose(calculate_fourier_comp_for_two_point_estimator(data, 
+                                                                     1.0),
+                      direct_transform(data, 1.0, 1))
+
+def test_batched_transform():
+    estimator = Estimator('n*n', 'numberOfSites:t')
+    random = np.random.RandomState(1)
+    for length, t in [(10, 1), (10, 2), (8, 1)]:
+        i, j = np.triu_indices(length)
+        estimator.add_columns(np.column_stack([i, j]), 
+                              random.normal(size=len(i)),
+                              '{0}:{1}'.format(length, t))
+    # a run whose sites are not the ones of the rest
+    i, j = np.triu_indices(10, 1)
+    estimator.add_columns(np.column_stack([j, i])[::-1], 
+                          random.normal(size=len(i)), '10:3')
+    for momenta in [None, [0.5, 2.0]]:
+        result = calculate_fourier_transform_for_two_point_estimator(
+            estimator, 'numberOfSites', momenta)
+        assert sorted(result.data.keys()) == sorted(estimator.data.keys())
+        for key, data in estimator.data.iteritems():
+            length = int(key.split(':')[0])
+            expected = (
+                calculate_fourier_transform_for_two_point_estimator_data(
+                    data, length, momenta))
+            assert np.allclose(result.data[key].x(), expected.x())
+            assert np.allclose(result.data[key].y(), expected.y())
@@ -2,6 +2,8 @@
 Test for locate estimator files function.
 '''
 import os
+import shutil
+import tempfile
 from dmrg_helpers.extract.locate_estimator_files import locate_estimator_files
 
 def test_locate_estimator_files():
@@ -14,3 +16,20 @@ def test_locate_estimator_files():
     print files_there
     assert files_found == files_there
 
+
+def test_same_file_compressed_and_not():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for name in ['one/estimators.dat', 'one/estimators.dat.gz',
+                     'two/estimators.dat.xz', 'two/estimators.dat.bz2',
+                     'two/estimators_2.dat.gz']:
+            filename = os.path.join(tmp_dir, name)
+            if not os.path.exists(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            open(filename, 'w').close()
+        files_found = locate_estimator_files(tmp_dir)
+        assert sorted(os.path.relpath(f, tmp_dir) for f in files_found) == [
+            'one/estimators.dat', 'two/estimators.dat.bz2', 
+            'two/estimators_2.dat.gz']
+    finally:
+        shutil.rmtree(tmp_dir)
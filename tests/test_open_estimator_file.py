@@ -0,0 +1,61 @@
+'''
+Test for reading compressed estimators files.
+'''
+import os
+import bz2
+import gzip
+import shutil
+from dmrg_helpers.extract.open_estimator_file import (detect_compression, 
+                                                      open_estimator_file, 
+                                                      lzma)
+from dmrg_helpers.extract.reader import FileReader
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.locate_estimator_files import locate_estimator_files
+
+openers = {'.gz': gzip.open, '.bz2': bz2.BZ2File}
+if lzma is not None:
+    openers['.xz'] = lzma.LZMAFile
+
+def setup_module():
+    with open('tests/file_ok.dat', 'r') as f:
+        contents = f.read()
+    for extension, opener in openers.iteritems():
+        f = opener('tests/file_ok.dat' + extension, 'w')
+        f.write(contents)
+        f.close()
+    os.makedirs('tests/compressed/one')
+    shutil.copy('tests/file_ok.dat.gz', 'tests/compressed/one/estimators.dat.gz')
+
+def teardown_module():
+    for extension in openers:
+        os.remove('tests/file_ok.dat' + extension)
+    shutil.rmtree('tests/compressed')
+
+def test_detect_compression():
+    assert detect_compression('tests/file_ok.dat') is None
+    assert detect_compression('tests/file_ok.dat.gz') == 'gzip'
+    assert detect_compression('tests/file_ok.dat.bz2') == 'bz2'
+
+def test_open_estimator_file():
+    with open('tests/file_ok.dat', 'r') as f:
+        contents = f.read()
+    for extension in openers:
+        with open_estimator_file('tests/file_ok.dat' + extension) as f:
+            assert f.read() == contents
+
+def test_readers():
+    for extension in openers:
+        reader = FileReader()
+        reader.read('tests/file_ok.dat' + extension)
+        assert reader.data == [['n_up_0', 1.0], ['n_up_1', 2.0]]
+        assert reader.meta['parameter_2'] == 'a_string'
+        reader = ColumnarFileReader()
+        reader.read('tests/file_ok.dat' + extension)
+        assert reader.values.tolist() == [1.0, 2.0]
+
+def test_locate_compressed_files():
+    files_found = locate_estimator_files('tests/compressed', 'estimators.dat')
+    assert files_found == [os.path.abspath(
+        'tests/compressed/one/estimators.dat.gz')]
+    assert locate_estimator_files('tests/compressed', 'estimators.dat', 
+                                  compressed=False) == []
@@ -0,0 +1,46 @@
+'''
+Test for the operator table.
+'''
+from nose.tools import raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.operator_table import OperatorTable, operator_table
+from dmrg_helpers.extract.estimator_name import EstimatorName
+from dmrg_helpers.extract.process_estimator_name import process_estimator_name
+
+def test_split():
+    table = OperatorTable()
+    assert table.split('s_m_dag_12') == (0, 12)
+    assert table.split('s_m_dag_12') == (0, 12)
+    assert table.names == ['s_m_dag']
+    assert table.hits == 1
+    assert table.misses == 1
+    assert table.hit_rate() == 0.5
+
+def test_process():
+    table = OperatorTable()
+    operator_id, sites = table.process('n_up_0*n_down_1')
+    assert table.operator_name(operator_id) == 'n_up*n_down'
+    assert sites == (0, 1)
+
+def test_process_estimator_name_uses_the_cache():
+    hits = operator_table.hits
+    names, sites = process_estimator_name('n_up_0*n_down_1')
+    assert names == ['n_up', 'n_down']
+    assert sites == [0, 1]
+    process_estimator_name('n_up_0*n_down_1')
+    assert operator_table.hits >= hits + 2
+
+def test_cache_is_bounded():
+    table = OperatorTable(max_cache_size=2)
+    for i in range(5):
+        table.split('n_{0}'.format(i))
+    assert len(table.cache) <= 2
+    assert len(table) == 1
+
+@raises(DMRGException)
+def test_bad_site():
+    OperatorTable().split('n_up_a')
+
+def test_shared_with_estimator_name():
+    n = EstimatorName(['s_z', 's_z'])
+    assert n.operator_id == operator_table.ids['s_z*s_z']
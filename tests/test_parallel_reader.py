@@ -0,0 +1,32 @@
+""" Tests for the parallel reader class.
+"""
+import numpy as np
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.parallel_reader import (ParallelFileReader,
+                                                  split_in_chunks)
+
+def test_split_in_chunks():
+    filename = 'tests/file_two_point_estimators.dat'
+    chunks = split_in_chunks(filename, 10)
+    with open(filename, 'r') as f:
+        contents = f.read()
+    assert ''.join(contents[start:end] for (_, start, end) in chunks) == contents
+    assert all(contents[end - 1] == '\n' for (_, start, end) in chunks[:-1])
+
+def test_same_as_columnar_reader():
+    filename = 'tests/real_data/static/estimators.dat'
+    reader = ColumnarFileReader()
+    reader.read(filename)
+    parallel_reader = ParallelFileReader(processes=2, chunk_size=100000)
+    parallel_reader.read(filename)
+    assert parallel_reader.meta == reader.meta
+    assert parallel_reader.comments == reader.comments
+    assert parallel_reader.operators == reader.operators
+    assert np.array_equal(parallel_reader.codes, reader.codes)
+    assert np.array_equal(parallel_reader.sites, reader.sites)
+    assert np.array_equal(parallel_reader.values, reader.values)
+
+def test_empty_file():
+    reader = ParallelFileReader(processes=2)
+    reader.read('tests/empty.dat')
+    assert len(reader) == 0
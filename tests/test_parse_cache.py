@@ -0,0 +1,89 @@
+'''
+Test for the parse cache.
+'''
+import os
+import shutil
+import tempfile
+import numpy as np
+from dmrg_helpers.extract.columnar_reader import ColumnarFileReader
+from dmrg_helpers.extract.parse_cache import ParseCache, read_header
+
+class TestParseCache(object):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'estimators.dat')
+        shutil.copy('tests/real_data/static/estimators.dat', self.filename)
+        self.reference = ColumnarFileReader()
+        self.reference.read(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self, parse_cache, estimators=None):
+        reader = ColumnarFileReader(estimators, parse_cache)
+        reader.read(self.filename)
+        return reader
+
+    def assert_same(self, reader):
+        assert reader.meta == self.reference.meta
+        assert reader.comments == self.reference.comments
+        assert reader.operators == self.reference.operators
+        assert np.array_equal(reader.codes, self.reference.codes)
+        assert np.array_equal(reader.sites, self.reference.sites)
+        assert np.array_equal(reader.values, self.reference.values)
+
+    def test_sidecar_next_to_file(self):
+        parse_cache = ParseCache()
+        sidecar = os.path.join(self.tmp_dir, '.estimators.dat.cache')
+        self.assert_same(self.read(parse_cache))
+        assert os.path.exists(sidecar)
+        reader = self.read(parse_cache)
+        assert isinstance(reader.values, np.memmap)
+        self.assert_same(reader)
+
+    def test_cache_dir(self):
+        parse_cache = ParseCache(os.path.join(self.tmp_dir, 'cache'))
+        self.read(parse_cache)
+        assert len(os.listdir(parse_cache.cache_dir)) == 1
+        self.assert_same(self.read(parse_cache))
+
+    def test_only_some_estimators(self):
+        parse_cache = ParseCache()
+        for i in range(2):
+            reader = self.read(parse_cache, ['s_z*s_z'])
+            assert reader.operators == ['s_z*s_z']
+            assert len(reader) == 4560
+        self.assert_same(self.read(parse_cache))
+
+    def test_stale_sidecar(self):
+        parse_cache = ParseCache()
+        self.read(parse_cache)
+        with open(self.filename, 'a') as f:
+            f.write('n_96 1.0\n')
+        reader = self.read(parse_cache)
+        assert len(reader) == len(self.reference) + 1
+        assert reader.values[-1] == 1.0
+        assert not isinstance(reader.values, np.memmap)
+
+    def test_corrupt_sidecar(self):
+        parse_cache = ParseCache()
+        self.read(parse_cache)
+        sidecar = parse_cache.sidecar_name(self.filename)
+        with open(sidecar, 'r+b') as f:
+            f.truncate(100)
+        self.assert_same(self.read(parse_cache))
+        self.assert_same(self.read(parse_cache))
+
+    def test_sidecar_with_bad_codes(self):
+        parse_cache = ParseCache()
+        self.read(parse_cache)
+        sidecar = parse_cache.sidecar_name(self.filename)
+        header, offset = read_header(sidecar, parse_cache.magic)
+        dtype, _, start = header['arrays']['codes']
+        with open(sidecar, 'r+b') as f:
+            f.seek(offset + start)
+            f.write(np.array([len(header['operators'])], dtype=dtype).tostring())
+        # the comments and metadata are not left in the reader either
+        self.assert_same(self.read(parse_cache))
+        self.assert_same(self.read(parse_cache))
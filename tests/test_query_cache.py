@@ -0,0 +1,45 @@
+'''
+Test for the cache of estimators.
+'''
+from dmrg_helpers.extract.database import Database
+from dmrg_helpers.extract.query_cache import QueryCache, make_key
+
+def test_least_recently_used_is_evicted():
+    cache = QueryCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+def test_disabled_cache():
+    cache = QueryCache()
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+def test_keys():
+    assert make_key('n', 'i') == make_key('n', 'i', {})
+    assert (make_key('n*n', ['i', 'i+1'], {'a': [1, 2], 'b': 3}) ==
+            make_key('n*n', ('i', 'i+1'), {'b': 3, 'a': (1, 2)}))
+    assert make_key('n*n', ['i', 'i+1']) != make_key('n*n', ['i', 'i+2'])
+
+def test_database_cache():
+    db = Database(cache_size=8)
+    db.insert_data_from_file('tests/file_two_point_estimators.dat')
+    n_up = db.get_estimator('n_up')
+    assert db.get_estimator('n_up') is n_up
+    assert db.get_estimators(['n_up*n_up', 'n_up'])[1] is n_up
+    assert db.get_estimator('n_up', meta={'parameter_1': 1.0}) is not n_up
+    assert (db.query_cache.hits, db.query_cache.misses) == (2, 3)
+
+def test_cache_is_cleared_on_insert():
+    db = Database(cache_size=8)
+    db.insert_data_from_file('tests/file_two_point_estimators.dat')
+    n_up = db.get_estimator('n_up')
+    db.insert_data_from_file('tests/file_two_point_estimators.dat')
+    assert len(db.query_cache) == 0
+    assert db.get_estimator('n_up') is not n_up
@@ -34,3 +34,17 @@ class TestFileReader(object):
         assert self.reader.comments == ['#\n',  '# Some comments\n', 
                                         '# META parameter_1 1.0\n', 
                                         '# META parameter_2 a_string\n', '#\n']
+
+    def test_stream_file_ok(self):
+        records = self.reader.stream('tests/file_ok.dat')
+        assert self.reader.meta == {}
+        assert list(records) == [['n_up_0', 1.0], ['n_up_1', 2.0]]
+        assert self.reader.data == []
+        assert self.reader.meta['parameter_1'] == '1.0'
+        assert self.reader.meta['parameter_2'] == 'a_string'
+
+    def test_only_some_estimators(self):
+        reader = FileReader(estimators=['n_up*n_up'])
+        reader.read('tests/file_two_point_estimators.dat')
+        assert reader.data == [['n_up_0*n_up_1', 3.0], ['n_up_1*n_up_2', 4.0]]
+        assert reader.meta['parameter_1'] == '1.0'
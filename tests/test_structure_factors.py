@@ -0,0 +1,60 @@
+'''
+Test for the structure factors.
+'''
+import os
+import shutil
+import tempfile
+import numpy as np
+from math import pi
+from dmrg_helpers.extract.database import Database
+from dmrg_helpers.analyze.structure_factors import (
+    calculate_full_spin_struct_factor)
+
+class TestFullSpinStructFactor(object):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.length = 6
+        random = np.random.RandomState(0)
+        self.components = {}
+        pairs = [(i, j) for i in xrange(self.length) 
+                 for j in xrange(i + 1, self.length)]
+        for name in ['s_z*s_z', 's_p*s_m', 's_m*s_p']:
+            self.components[name] = dict(zip(pairs, 
+                                             random.normal(size=len(pairs))))
+        # a pair missing in a component is not used
+        del self.components['s_m*s_p'][(0, 5)]
+        self.db = Database()
+        for k in ['1.0', '2.0']:
+            filename = os.path.join(self.tmp_dir, k + '.dat')
+            with open(filename, 'w') as f:
+                f.write('# META numberOfSites {0}\n'.format(self.length))
+                f.write('# META Kring {0}\n'.format(k))
+                for name, values in self.components.iteritems():
+                    first, second = name.split('*')
+                    for (i, j), value in values.iteritems():
+                        f.write('{0}_{1}*{2}_{3} {4!r}\n'.format(
+                            first, i, second, j, value))
+            self.db.insert_data_from_file(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_as_direct_sum(self):
+        result = calculate_full_spin_struct_factor(self.db)
+        assert sorted(result.data.keys()) == ['1.0:6', '2.0:6']
+        zz, pm, mp = [self.components[name] 
+                      for name in ['s_z*s_z', 's_p*s_m', 's_m*s_p']]
+        for data in result.data.itervalues():
+            momenta = 2 * pi * np.arange(self.length) / self.length
+            assert np.allclose(data.x(), momenta)
+            expected = [2 * sum((zz[s] + 0.5 * (pm[s] + mp[s])) * 
+                                np.cos(q * (s[0] - s[1])) for s in mp) / 
+                        self.length for q in momenta]
+            assert np.allclose(data.y(), expected)
+
+    def test_one_transverse_component(self):
+        result = calculate_full_spin_struct_factor(self.db, mp=None)
+        zz, pm = [self.components[name] for name in ['s_z*s_z', 's_p*s_m']]
+        expected = 2 * sum(zz[s] + pm[s] for s in pm) / self.length
+        assert np.isclose(result.data['1.0:6'].y()[0], expected)
@@ -0,0 +1,85 @@
+'''
+Test for the tail reader.
+'''
+import os
+import shutil
+import tempfile
+import numpy as np
+from nose.tools import raises
+from dmrg_helpers.core.dmrg_exceptions import DMRGException
+from dmrg_helpers.extract.database import Database
+from dmrg_helpers.extract.tail_reader import TailFileReader
+
+class TestTailFileReader(object):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'estimators.dat')
+        self.write('# META parameter_1 1.0\nn_up_0 1.0\nn_up_1 2.', 'w')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mode='a'):
+        with open(self.filename, mode) as f:
+            f.write(text)
+
+    def test_reads_only_appended_data(self):
+        reader = TailFileReader()
+        reader.read(self.filename)
+        assert reader.meta == {'parameter_1': '1.0'}
+        assert np.array_equal(reader.values, [1.0])
+        assert reader.partial == 'n_up_1 2.'
+        self.write('5\nn_up_0*n_up_1 3.0\n')
+        reader.read(self.filename)
+        assert reader.operators == ['n_up', 'n_up*n_up']
+        assert np.array_equal(reader.values, [2.5, 3.0])
+        assert np.array_equal(reader.sites, [[1, -1], [0, 1]])
+        reader.read(self.filename)
+        assert len(reader) == 0
+
+    def test_truncated_file(self):
+        reader = TailFileReader()
+        reader.read(self.filename)
+        self.write('n_up_2 4.0\n', 'w')
+        reader.read(self.filename)
+        assert reader.restarted
+        assert reader.meta == {}
+        assert np.array_equal(reader.values, [4.0])
+
+    def test_only_some_estimators(self):
+        reader = TailFileReader('n_up*n_up')
+        reader.read(self.filename)
+        self.write('0\nn_up_0*n_up_1 3.0\n')
+        reader.read(self.filename)
+        assert np.array_equal(reader.values, [3.0])
+
+    @raises(DMRGException)
+    def test_different_file(self):
+        reader = TailFileReader()
+        reader.read(self.filename)
+        reader.read('tests/file_ok.dat')
+
+    def test_database(self):
+        db = Database()
+        assert db.insert_appended_data_from_file(self.filename) == 1
+        self.write('5\nn_up_2 3.0\n')
+        assert db.insert_appended_data_from_file(self.filename) == 2
+        assert db.insert_appended_data_from_file(self.filename) == 0
+        n_up = db.get_estimator('n_up')
+        assert sorted(n_up.data['1.0'].y()) == [1.0, 2.5, 3.0]
+
+    def test_metadata_after_data(self):
+        reader = TailFileReader()
+        reader.read(self.filename)
+        self.write('5\n# META parameter_1 2.0\nn_up_2 3.0\n')
+        reader.read(self.filename)
+        assert reader.meta == {'parameter_1': '1.0'}
+        assert np.array_equal(reader.values, [2.5, 3.0])
+
+    def test_metadata_after_data_in_the_first_read(self):
+        self.write('5\n# META parameter_2 a_string\n')
+        reader = TailFileReader()
+        reader.read(self.filename)
+        assert reader.meta == {'parameter_1': '1.0'}
+        assert np.array_equal(reader.values, [1.0, 2.5])